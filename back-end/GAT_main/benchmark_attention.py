@@ -0,0 +1,177 @@
+import time
+import queue
+import argparse
+import multiprocessing
+
+import torch
+from torch import nn
+from torch.optim import Adam
+
+from models import GAT
+from layers import GraphAttentionLayer
+from utils import knn_adjacency
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+#################################
+### DENSE VS SPARSE ATTENTION ###
+#################################
+
+def _peak_memory_mb(device):
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10 # ru_maxrss is in KiB on Linux
+    return float('nan')
+
+def run_case(mode, n_nodes, args):
+    """Times one training step of the GAT on a random graph and reports the peak memory of this process."""
+    torch.manual_seed(args.seed)
+    torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+
+    features = torch.randn(n_nodes, 25, device=device)
+    target = torch.randn(n_nodes, device=device)
+    if mode == 'dense':
+        adj_mat = torch.ones((n_nodes, n_nodes), device=device)
+    else:
+        adj_mat = knn_adjacency(features, args.top_k)
+
+    model = GAT(in_features=25, n_hidden=args.hidden_dim, n_heads=args.num_heads, num_classes=1).to(device)
+    optimizer = Adam(model.parameters(), lr=0.005)
+    criterion = nn.MSELoss()
+
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+    baseline = _peak_memory_mb(device)
+
+    timings = []
+    for step in range(args.warmup + args.steps):
+        start_t = time.perf_counter()
+        model.train()
+        optimizer.zero_grad()
+        output, edge = model(features, adj_mat)
+        loss = criterion(output.squeeze(1), target)
+        loss.backward()
+        optimizer.step()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        if step >= args.warmup:
+            timings.append(time.perf_counter() - start_t)
+
+    peak = _peak_memory_mb(device)
+    if device.type != 'cuda':
+        peak -= baseline # growth of the process peak RSS during the training steps
+    return sum(timings) / len(timings), peak
+
+#################################
+###  MASKING: PER-EPOCH TIMES  ###
+#################################
+
+def _legacy_attention_mask(layer, adj_mat):
+    # the previous masking allocated a full (heads, nodes, nodes) mask on every forward pass
+    shape = adj_mat.shape[:-2] + (layer.n_heads,) + adj_mat.shape[-2:]
+    connectivity_mask = -9e16 * torch.ones(shape, device=adj_mat.device)
+    return torch.where(adj_mat.unsqueeze(-3) > 0, torch.zeros_like(connectivity_mask), connectivity_mask)
+
+def run_epoch_case(variant, n_nodes, complete, args):
+    """Times one epoch as run by `train_iter`: a training step followed by two evaluation forward passes."""
+    torch.manual_seed(args.seed)
+    torch.set_num_threads(args.threads)
+    device = torch.device(args.device)
+
+    features = torch.randn(n_nodes, 25, device=device)
+    target = torch.randn(n_nodes, device=device)
+    adj_mat = torch.ones((n_nodes, n_nodes), device=device)
+    if not complete:
+        adj_mat = (torch.rand((n_nodes, n_nodes), device=device) > 0.5).float()
+        adj_mat.fill_diagonal_(1)
+
+    model = GAT(in_features=25, n_hidden=args.hidden_dim, n_heads=args.num_heads, num_classes=1).to(device)
+    if variant == 'legacy':
+        for layer in model.modules():
+            if isinstance(layer, GraphAttentionLayer):
+                layer._attention_mask = lambda adj, layer=layer: _legacy_attention_mask(layer, adj)
+    elif variant == 'compiled':
+        model = torch.compile(model)
+    optimizer = Adam(model.parameters(), lr=0.005)
+    criterion = nn.MSELoss()
+
+    timings = []
+    for epoch in range(args.warmup + args.steps):
+        start_t = time.perf_counter()
+        model.train()
+        optimizer.zero_grad()
+        output, edge = model(features, adj_mat)
+        loss = criterion(output.squeeze(1), target)
+        loss.backward()
+        optimizer.step()
+        model.eval()
+        with torch.no_grad():
+            for _ in range(2):
+                output, edge = model(features, adj_mat)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        if epoch >= args.warmup:
+            timings.append(time.perf_counter() - start_t)
+    return sum(timings) / len(timings)
+
+def _run_case_in_child(results, mode, n_nodes, args):
+    try:
+        results.put(run_case(mode, n_nodes, args))
+    except RuntimeError as e: # typically out of memory for the dense path at large N
+        print(f'{mode} N={n_nodes} failed: {e}')
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark dense vs. top-k sparse GAT attention')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[74, 500, 2000],
+                        help='graph sizes to benchmark (default: 74 500 2000)')
+    parser.add_argument('--top-k', type=int, default=16,
+                        help='neighbours per node for the sparse path (default: 16)')
+    parser.add_argument('--hidden-dim', type=int, default=64,
+                        help='dimension of the hidden representation (default: 64)')
+    parser.add_argument('--num-heads', type=int, default=8,
+                        help='number of the attention heads (default: 8)')
+    parser.add_argument('--steps', type=int, default=10,
+                        help='timed training steps per case (default: 10)')
+    parser.add_argument('--warmup', type=int, default=2,
+                        help='untimed warmup steps per case (default: 2)')
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads(),
+                        help='torch threads (default: all cores)')
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu',
+                        help='device to run on (default: cuda if available)')
+    parser.add_argument('--seed', type=int, default=13, metavar='S',
+                        help='random seed (default: 13)')
+    parser.add_argument('--masking', action='store_true', default=False,
+                        help='benchmark per-epoch time of the attention masking variants instead (default: False)')
+    parser.add_argument('--compile', action='store_true', default=False,
+                        help='with --masking, also time a torch.compile-d model (default: False)')
+    args = parser.parse_args()
+
+    if args.masking:
+        variants = ['legacy', 'cached'] + (['compiled'] if args.compile else [])
+        print(f'{"N":>6} {"graph":>9} ' + ' '.join(f'{v + " (ms)":>14}' for v in variants))
+        for n_nodes in args.nodes:
+            for complete in (True, False):
+                timings = [run_epoch_case(variant, n_nodes, complete, args) for variant in variants]
+                graph = 'complete' if complete else 'random'
+                print(f'{n_nodes:>6} {graph:>9} ' + ' '.join(f'{t * 1000:>14.2f}' for t in timings))
+    else:
+        # every case runs in a fresh process so that the peak memory of one case does not hide the next
+        ctx = multiprocessing.get_context('spawn')
+        print(f'{"N":>6} {"mode":>8} {"step (ms)":>10} {"peak mem (MB)":>14}')
+        for n_nodes in args.nodes:
+            for mode in ('dense', 'sparse'):
+                results = ctx.Queue()
+                process = ctx.Process(target=_run_case_in_child, args=(results, mode, n_nodes, args))
+                process.start()
+                process.join()
+                try:
+                    step_time, peak = results.get(timeout=1)
+                except queue.Empty: # the case failed or the process was killed
+                    step_time, peak = float('nan'), float('nan')
+                print(f'{n_nodes:>6} {mode:>8} {step_time * 1000:>10.2f} {peak:>14.1f}')
@@ -1,63 +1,136 @@
-import os
-import time
-import requests
-import tarfile
-import numpy as np
+import json
 import argparse
+import numpy as np
 import pandas as pd
-import glob
-
-from models import GAT
-from utils import load_cora
 
-import torch
-from torch import nn
-import torch.nn.functional as F
-from torch.optim import Adam
 import matplotlib.pyplot as plt
 import networkx as nx
 
 
-# 假设CSV文件的路径
-csv_file_path = 'tensor_epoch_2579.csv'
-# 从CSV文件中读取边权重数据
-edge_weights_matrix = pd.read_csv(csv_file_path, header=None).values
+#################################
+### ATTENTION EDGE EXTRACTION ###
+#################################
+
+def load_attention(csv_file_path):
+    """
+    Reads an attention matrix written by `train.py` (`output/tensor_epoch_<date>.csv`).
+
+    Returns:
+        tuple: the (n_nodes, n_nodes) float32 matrix and the stock codes of its columns.
+    """
+    df = pd.read_csv(csv_file_path)
+    return df.values.astype(np.float32), [str(c) for c in df.columns]
+
+
+def extract_edges(matrix, top_k=None, fraction=None, percentile=None):
+    """
+    Extracts the non-zero entries of an attention matrix as a COO edge list, strongest edges first.
+
+    Args:
+        matrix (array-like): (n_nodes, n_nodes) attention matrix, row i holds the weights of the edges i -> j.
+        top_k (int, optional): keep only the k strongest outgoing edges of every node.
+        fraction (float, optional): keep only the strongest `fraction` of all edges (1.0 keeps every edge).
+        percentile (float, optional): keep only the edges whose weight is at or above this percentile
+            of the edge weights.
+
+    Returns:
+        tuple: `rows`, `cols` and `weights` arrays of the kept edges, sorted by descending weight.
+    """
+    weights_matrix = np.asarray(matrix, dtype=np.float32)
+    n_rows, n_cols = weights_matrix.shape
+
+    if top_k is not None:
+        # k strongest columns of every row without sorting the whole row
+        k = min(top_k, n_cols)
+        cols = np.argpartition(-weights_matrix, k - 1, axis=1)[:, :k].ravel()
+        rows = np.repeat(np.arange(n_rows), k)
+        weights = weights_matrix[rows, cols]
+        keep = weights != 0
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    else:
+        rows, cols = np.nonzero(weights_matrix)
+        weights = weights_matrix[rows, cols]
+
+    if percentile is not None and len(weights) > 0:
+        keep = weights >= np.percentile(weights, percentile)
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+    if fraction is not None:
+        n_keep = int(fraction * len(weights))
+        if n_keep < len(weights):
+            keep = np.zeros(len(weights), dtype=bool)
+            if n_keep > 0:
+                # weight of the n_keep-th strongest edge, ties at that weight are taken in row-major order
+                # so the selection matches a stable sort of the whole edge list
+                threshold = np.partition(weights, len(weights) - n_keep)[len(weights) - n_keep]
+                keep = weights > threshold
+                ties = np.flatnonzero(weights == threshold)[:n_keep - keep.sum()]
+                keep[ties] = True
+            rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+    order = np.argsort(-weights, kind='stable')
+    return rows[order], cols[order], weights[order]
+
+
+def to_networkx(rows, cols, weights, n_nodes, directed=True):
+    """Builds a networkx graph with nodes 0..n_nodes-1 and the given weighted edges."""
+    G = nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from(range(n_nodes))
+    G.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), weights.tolist()))
+    return G
+
+
+def to_json(rows, cols, weights, stock_codes):
+    """
+    Compact, column-oriented JSON form of an edge list for the front end:
+    `{"nodes": [...], "source": [...], "target": [...], "weight": [...]}`, sources and targets index `nodes`.
+    """
+    return json.dumps({
+        'nodes': list(stock_codes),
+        'source': rows.tolist(),
+        'target': cols.tolist(),
+        'weight': np.round(weights.astype(np.float64), 6).tolist(),
+    }, separators=(',', ':'))
 
-print(edge_weights_matrix.shape[0])
 
-# 创建有向图
-G = nx.DiGraph()
+if __name__ == '__main__':
 
-# 添加节点
-for i in range(edge_weights_matrix.shape[0]):
-    G.add_node(i)
+    parser = argparse.ArgumentParser(description='Draw or export the edges of a GAT attention matrix')
+    parser.add_argument('csv_file_path', nargs='?', default='output/tensor_epoch_2025-05-16.csv',
+                        help='attention matrix written by train.py (default: output/tensor_epoch_2025-05-16.csv)')
+    parser.add_argument('--top-k', type=int, default=None,
+                        help='keep the k strongest outgoing edges of every stock (default: None)')
+    parser.add_argument('--fraction', type=float, default=1.0,
+                        help='keep the strongest fraction of the edges (default: 1.0)')
+    parser.add_argument('--percentile', type=float, default=None,
+                        help='keep the edges at or above this weight percentile (default: None)')
+    parser.add_argument('--json', type=str, default=None,
+                        help='write the edge list as compact JSON to this path instead of drawing it')
+    args = parser.parse_args()
 
-# 添加带权重的边
-all_edges = []
-for i in range(edge_weights_matrix.shape[0]):
-    for j in range(edge_weights_matrix.shape[1]):
-        weight = edge_weights_matrix[i, j]
-        if weight != 0:
-            all_edges.append((i, j, weight))
+    # 从CSV文件中读取边权重数据
+    edge_weights_matrix, stock_codes = load_attention(args.csv_file_path)
 
-# 根据权重对边进行排序
-all_edges.sort(key=lambda x: x[2], reverse=True)  # 保证是从大到小排序
+    print(edge_weights_matrix.shape[0])
 
-# 获取前1%的边
-top_edges = all_edges[:int(1 * len(all_edges))]
+    # 根据权重取出并排序边（从大到小）
+    rows, cols, weights = extract_edges(edge_weights_matrix, args.top_k, args.fraction, args.percentile)
 
-# 添加前1%的边
-for edge in top_edges:
-    G.add_edge(edge[0], edge[1], weight=edge[2])
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(to_json(rows, cols, weights, stock_codes))
+    else:
+        # 创建有向图
+        G = to_networkx(rows, cols, weights, edge_weights_matrix.shape[0])
 
-# 绘制图形，其中节点大小为1000，边的宽度为3
-pos = nx.spring_layout(G)  # 使用spring布局
-plt.figure(figsize=(15, 15))  # 图形尺寸更大
-nx.draw(G, pos, with_labels=True, node_size=5000, node_color='skyblue', font_size=20, width=2)
+        # 绘制图形，其中节点大小为1000，边的宽度为3
+        pos = nx.spring_layout(G)  # 使用spring布局
+        plt.figure(figsize=(15, 15))  # 图形尺寸更大
+        nx.draw(G, pos, with_labels=True, node_size=5000, node_color='skyblue', font_size=20, width=2)
 
-# 绘制边权重
-edge_labels = nx.get_edge_attributes(G, 'weight')
-nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=7)
+        # 绘制边权重
+        edge_labels = nx.get_edge_attributes(G, 'weight')
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=7)
 
-# 显示图形
-plt.show()
\ No newline at end of file
+        # 显示图形
+        plt.show()
@@ -21,10 +21,11 @@ class GraphAttentionLayer(nn.Module):
             a is an attention mechanism that computes the attention coefficients e_ij, and σ is an activation function.
 
     """
-    def __init__(self, in_features: float, out_features: float, n_heads: int, concat: bool = False, dropout: float = 0.4, leaky_relu_slope: float = 0.2):
+    def __init__(self, in_features: float, out_features: float, n_heads: int, concat: bool = False, dropout: float = 0.4, leaky_relu_slope: float = 0.2, n_graphs: int = None):
         super(GraphAttentionLayer, self).__init__()
 
         self.n_heads = n_heads # Number of attention heads
+        self.n_graphs = n_graphs # Number of graphs with their own parameters (None: one set shared by every graph)
         self.concat = concat # wether to concatenate the final attention heads
         self.dropout = dropout # Dropout rate
 
@@ -35,16 +36,24 @@ class GraphAttentionLayer(nn.Module):
         else: # averaging output over the attention heads (Used in the main paper)
             self.n_hidden = out_features
 
+        # independent graphs get a leading n_graphs dimension on every parameter
+        graph_dim = () if n_graphs is None else (n_graphs,)
+
         #  A shared linear transformation, parametrized by a weight matrix W is applied to every node
         #  Initialize the weight matrix W 
-        self.W = nn.Parameter(torch.empty(size=(in_features, self.n_hidden * n_heads)))
+        self.W = nn.Parameter(torch.empty(size=graph_dim + (in_features, self.n_hidden * n_heads)))
         # Initialize the attention weights a
-        self.a = nn.Parameter(torch.empty(size=(n_heads, 2 * self.n_hidden, 1)))
+        self.a = nn.Parameter(torch.empty(size=graph_dim + (n_heads, 2 * self.n_hidden, 1)))
 
 
         self.leakyrelu = nn.LeakyReLU(leaky_relu_slope) # LeakyReLU activation function
         self.softmax = nn.Softmax(dim=1) # softmax activation function to the attention coefficients
 
+        # additive attention mask cached for the last adjacency matrix seen (None: complete graph, no masking)
+        self._mask_adj = None
+        self._mask_version = None
+        self._mask = None
+
         self.reset_parameters() # Reset the parameters
 
 
@@ -52,8 +61,14 @@ class GraphAttentionLayer(nn.Module):
         """
         Reinitialize learnable parameters.
         """
-        nn.init.xavier_normal_(self.W)
-        nn.init.xavier_normal_(self.a)
+        if self.n_graphs is None:
+            nn.init.xavier_normal_(self.W)
+            nn.init.xavier_normal_(self.a)
+        else:
+            # initialize graph by graph so that each one gets the same fan-in/fan-out as the unbatched layer
+            for W, a in zip(self.W.data, self.a.data):
+                nn.init.xavier_normal_(W)
+                nn.init.xavier_normal_(a)
     
 
     def _get_attention_scores(self, h_transformed: torch.Tensor):
@@ -66,67 +81,150 @@ class GraphAttentionLayer(nn.Module):
             where || denotes the concatenation operation, and a and W are the learnable parameters.
 
         Args:
-            h_transformed (torch.Tensor): Transformed feature matrix with shape (n_nodes, n_heads, n_hidden),
+            h_transformed (torch.Tensor): Transformed feature matrix with shape ([n_graphs,] n_heads, n_nodes, n_hidden),
                 where n_nodes is the number of nodes and out_features is the number of output features per node.
 
         Returns:
-            torch.Tensor: Attention score matrix with shape (n_heads, n_nodes, n_nodes), where n_nodes is the number of nodes.
+            torch.Tensor: Attention score matrix with shape ([n_graphs,] n_heads, n_nodes, n_nodes), where n_nodes is the number of nodes.
         """
         
-        source_scores = torch.matmul(h_transformed, self.a[:, :self.n_hidden, :])
-        target_scores = torch.matmul(h_transformed, self.a[:, self.n_hidden:, :])
+        source_scores = torch.matmul(h_transformed, self.a[..., :self.n_hidden, :])
+        target_scores = torch.matmul(h_transformed, self.a[..., self.n_hidden:, :])
 
         # broadcast add 
         # (n_heads, n_nodes, 1) + (n_heads, 1, n_nodes) = (n_heads, n_nodes, n_nodes)
         e = source_scores + target_scores.mT
         return self.leakyrelu(e)
 
+    @torch.compiler.disable # data-dependent checks on the adjacency matrix stay outside torch.compile graphs
+    def _attention_mask(self, adj_mat: torch.Tensor):
+        """returns the additive attention mask of a dense adjacency matrix, 0 for existing edges and -9e16
+        for non-existent ones, with a heads dimension so it broadcasts over the attention scores.
+
+        the mask is cached and only rebuilt when a different adjacency tensor is passed in or the same one
+        is modified in place. for a complete graph no mask is needed at all and None is returned.
+
+        Args:
+            adj_mat (torch.Tensor): Adjacency matrix with shape ([n_graphs,] n_nodes, n_nodes).
+
+        Returns:
+            torch.Tensor or None: Additive mask with shape ([n_graphs,] 1, n_nodes, n_nodes).
+        """
+        if adj_mat is not self._mask_adj or adj_mat._version != self._mask_version:
+            connected = adj_mat > 0
+            if bool(connected.all()):
+                self._mask = None
+            else:
+                mask = torch.zeros(adj_mat.shape, dtype=torch.float, device=adj_mat.device)
+                self._mask = mask.masked_fill_(~connected, -9e16).unsqueeze(-3)
+            # keeping a reference to the adjacency matrix makes the identity check safe
+            self._mask_adj = adj_mat
+            self._mask_version = adj_mat._version
+        return self._mask
+
+    def _sparse_attention(self, h_transformed: torch.Tensor, adj_mat: torch.Tensor):
+        """calculates the attention coefficients and the aggregated node features only over the edges
+        of a sparse adjacency matrix, so that memory grows with the number of edges instead of n_nodes^2.
+        the softmax over the neighbours j of every node i is computed as a scatter softmax over the edge list:
+
+            α_ij = exp(e_ij - max_k e_ik) / Σ_k(exp(e_ik - max_k e_ik))     for every edge (i, j)
+
+        Args:
+            h_transformed (torch.Tensor): Transformed feature matrix with shape (n_heads, n_nodes, n_hidden).
+            adj_mat (torch.Tensor): Sparse COO adjacency matrix with shape (n_nodes, n_nodes).
+
+        Returns:
+            tuple: Sparse attention matrix with shape (n_heads, n_nodes, n_nodes) and the aggregated
+                node features with shape (n_heads, n_nodes, n_hidden).
+        """
+        n_heads, n_nodes, _ = h_transformed.shape
+        adj_mat = adj_mat.coalesce()
+        src, dst = adj_mat.indices()[:, adj_mat.values() > 0]
+        n_edges = src.shape[0]
+
+        # e_ij = LeakyReLU(a^T [Wh_i || Wh_j]) for the existing edges only
+        # output shape (n_heads, n_edges)
+        source_scores = torch.matmul(h_transformed, self.a[:, :self.n_hidden, :]).squeeze(-1)
+        target_scores = torch.matmul(h_transformed, self.a[:, self.n_hidden:, :]).squeeze(-1)
+        e = self.leakyrelu(source_scores[:, src] + target_scores[:, dst])
+
+        # scatter softmax over the edges that share the same source node
+        index = src.expand(n_heads, -1)
+        e_max = e.new_full((n_heads, n_nodes), float('-inf')).scatter_reduce(1, index, e.detach(), reduce='amax')
+        e = torch.exp(e - e_max.gather(1, index))
+        denominator = e.new_zeros((n_heads, n_nodes)).scatter_add(1, index, e)
+        attention = e / denominator.gather(1, index)
+        attention = F.dropout(attention, self.dropout, training=self.training)
+
+        heads = torch.arange(n_heads, device=src.device).repeat_interleave(n_edges)
+        attention = torch.sparse_coo_tensor(
+            torch.stack([heads, src.repeat(n_heads), dst.repeat(n_heads)]),
+            attention.reshape(-1), (n_heads, n_nodes, n_nodes), check_invariants=False)
+
+        # h_i' = Σ_j(α_ij W h_j) as a sparse-dense batched matmul, so no (n_heads, n_edges, n_hidden) tensor of
+        # per-edge messages is built (or kept for the backward pass)
+        h_prime = torch.bmm(attention, h_transformed)
+        return attention, h_prime
+
     def forward(self,  h: torch.Tensor, adj_mat: torch.Tensor, return_attention_weights=False):
         """
         Performs a graph attention layer operation.
 
         Args:
-            h (torch.Tensor): Input tensor representing node features.
-            adj_mat (torch.Tensor): Adjacency matrix representing graph structure.
+            h (torch.Tensor): Input tensor representing node features, with shape (n_nodes, in_features)
+                or (n_graphs, n_nodes, in_features) to process a batch of graphs at once.
+            adj_mat (torch.Tensor): Adjacency matrix representing graph structure, with shape (n_nodes, n_nodes)
+                shared by every graph or (n_graphs, n_nodes, n_nodes). A sparse COO adjacency matrix selects the
+                edge-list attention path, which is only available for a single graph.
 
         Returns:
             torch.Tensor: Output tensor after the graph convolution operation.
         """
-        n_nodes = h.shape[0]
+        n_nodes = h.shape[-2]
+        batch_shape = h.shape[:-2]
+        if adj_mat.is_sparse and (len(batch_shape) > 0 or self.n_graphs is not None):
+            raise ValueError('sparse adjacency matrices are only supported for a single graph')
 
         # Apply linear transformation to node feature -> W h
-        # output shape (n_nodes, n_hidden * n_heads)
+        # output shape ([n_graphs,] n_nodes, n_hidden * n_heads)
         h = h.float()
 
-        h_transformed = torch.mm(h, self.W)
+        h_transformed = torch.matmul(h, self.W)
         h_transformed = F.dropout(h_transformed, self.dropout, training=self.training)
 
         # splitting the heads by reshaping the tensor and putting heads dim first
-        # output shape (n_heads, n_nodes, n_hidden)
-        h_transformed = h_transformed.view(n_nodes, self.n_heads, self.n_hidden).permute(1, 0, 2)
+        # output shape ([n_graphs,] n_heads, n_nodes, n_hidden)
+        h_transformed = h_transformed.view(*batch_shape, n_nodes, self.n_heads, self.n_hidden).transpose(-3, -2)
         
-        # getting the attention scores
-        # output shape (n_heads, n_nodes, n_nodes)
-        e = self._get_attention_scores(h_transformed)
-
-        # Set the attention score for non-existent edges to -9e15 (MASKING NON-EXISTENT EDGES)
-        connectivity_mask = -9e16 * torch.ones_like(e)
-        e = torch.where(adj_mat > 0, e, connectivity_mask) # masked attention scores
-        
-        # attention coefficients are computed as a softmax over the rows
-        # for each column j in the attention score matrix e
-        attention = F.softmax(e, dim=-1)
-        attention = F.dropout(attention, self.dropout, training=self.training)
+        if adj_mat.is_sparse:
+            # attention and aggregation over the edge list
+            # output shapes (n_heads, n_nodes, n_nodes) sparse and (n_heads, n_nodes, n_hidden)
+            attention, h_prime = self._sparse_attention(h_transformed, adj_mat)
+        else:
+            # getting the attention scores
+            # output shape ([n_graphs,] n_heads, n_nodes, n_nodes)
+            e = self._get_attention_scores(h_transformed)
+
+            # Push the attention score for non-existent edges down to -9e16 (MASKING NON-EXISTENT EDGES)
+            # with the cached additive mask, added in place; complete graphs skip the masking entirely
+            connectivity_mask = self._attention_mask(adj_mat)
+            if connectivity_mask is not None:
+                e.add_(connectivity_mask) # masked attention scores
+            
+            # attention coefficients are computed as a softmax over the rows
+            # for each column j in the attention score matrix e
+            attention = F.softmax(e, dim=-1)
+            attention = F.dropout(attention, self.dropout, training=self.training)
 
-        # final node embeddings are computed as a weighted average of the features of its neighbors
-        h_prime = torch.matmul(attention, h_transformed)
+            # final node embeddings are computed as a weighted average of the features of its neighbors
+            h_prime = torch.matmul(attention, h_transformed)
 
         # concatenating/averaging the attention heads
-        # output shape (n_nodes, out_features)
+        # output shape ([n_graphs,] n_nodes, out_features)
         if self.concat:
-            h_prime = h_prime.permute(1, 0, 2).contiguous().view(n_nodes, self.out_features)
+            h_prime = h_prime.transpose(-3, -2).contiguous().view(*batch_shape, n_nodes, self.out_features)
         else:
-            h_prime = h_prime.mean(dim=0)
+            h_prime = h_prime.mean(dim=-3)
 
         if return_attention_weights:
             return h_prime, attention
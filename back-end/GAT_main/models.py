@@ -21,7 +21,8 @@ class GAT(nn.Module):
         num_classes,
         concat=False,
         dropout=0.4,
-        leaky_relu_slope=0.2):
+        leaky_relu_slope=0.2,
+        n_graphs=None):
         """ Initializes the GAT model. 
 
         Args:
@@ -33,6 +34,8 @@ class GAT(nn.Module):
                 output of the first Graph Attention Layer. Defaults to False.
             dropout (float, optional): dropout rate. Defaults to 0.4.
             leaky_relu_slope (float, optional): alpha (slope) of the leaky relu activation. Defaults to 0.2.
+            n_graphs (int, optional): number of graphs trained side by side with their own parameters. The inputs
+                then carry a leading n_graphs dimension. Defaults to None (a single set of parameters).
         """
 
         super(GAT, self).__init__()
@@ -40,7 +43,7 @@ class GAT(nn.Module):
         # Define the Graph Attention layers
         self.gat1 = GraphAttentionLayer(
             in_features=in_features, out_features=n_hidden, n_heads=n_heads,
-            concat=concat, dropout=dropout, leaky_relu_slope=leaky_relu_slope
+            concat=concat, dropout=dropout, leaky_relu_slope=leaky_relu_slope, n_graphs=n_graphs
             )
         
         #self.gat2 = GraphAttentionLayer(
@@ -50,7 +53,7 @@ class GAT(nn.Module):
             
         self.gat2 = GraphAttentionLayer(
             in_features=n_hidden, out_features=1, n_heads=1,
-            concat=False, dropout=dropout, leaky_relu_slope=leaky_relu_slope
+            concat=False, dropout=dropout, leaky_relu_slope=leaky_relu_slope, n_graphs=n_graphs
             )
         
 
@@ -59,8 +62,8 @@ class GAT(nn.Module):
         Performs a forward pass through the network.
 
         Args:
-            input_tensor (torch.Tensor): Input tensor representing node features.
-            adj_mat (torch.Tensor): Adjacency matrix representing graph structure.
+            input_tensor (torch.Tensor): Input tensor representing node features, optionally batched over graphs.
+            adj_mat (torch.Tensor): Adjacency matrix representing graph structure, optionally batched over graphs.
 
         Returns:
             torch.Tensor: Output tensor after the forward pass.
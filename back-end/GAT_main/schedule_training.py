@@ -6,6 +6,7 @@ import sys
 import logging
 from pathlib import Path
 import shutil
+import argparse
 
 # 設定日誌
 logging.basicConfig(
@@ -90,8 +91,15 @@ def get_next_quarter_date():
     
     return datetime(year, month, day)
 
-def run_training():
-    """執行資料更新和模型訓練"""
+def run_training(workers=None, threads_per_worker=1):
+    """執行資料更新和模型訓練
+
+    每一季的 GAT 圖交給 `workers` 個行程平行訓練，每個行程使用 `threads_per_worker` 個 torch 執行緒，
+    預設依 CPU 核心數決定 worker 數量。
+    """
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+
     try:
         logging.info("開始執行資料更新和模型訓練")
         
@@ -100,21 +108,21 @@ def run_training():
         os.system('python finmind_scrapt.py')
         
         # 執行模型訓練
-        logging.info("執行模型訓練...")
-        os.system('python train.py')
+        logging.info(f"執行模型訓練 ({workers} workers x {threads_per_worker} threads)...")
+        os.system(f'python train.py --workers {workers} --threads-per-worker {threads_per_worker}')
         
         logging.info("資料更新和模型訓練完成")
         
     except Exception as e:
         logging.error(f"執行過程中發生錯誤: {str(e)}")
 
-def schedule_next_training():
+def schedule_next_training(workers=None, threads_per_worker=1):
     """排程下一次訓練"""
     next_date = get_next_quarter_date()
     logging.info(f"下次訓練時間設定為: {next_date.strftime('%Y-%m-%d')}")
     
     # 設定排程
-    schedule.every().day.at("00:00").do(check_and_run_training)
+    schedule.every().day.at("00:00").do(check_and_run_training, workers=workers, threads_per_worker=threads_per_worker)
     # 設定每月1號清理過期資料
     schedule.every().month.at("01:00").do(clean_old_data)
     
@@ -122,16 +130,23 @@ def schedule_next_training():
         schedule.run_pending()
         time.sleep(3600)  # 每小時檢查一次
 
-def check_and_run_training():
+def check_and_run_training(workers=None, threads_per_worker=1):
     """檢查是否需要執行訓練"""
     next_date = get_next_quarter_date()
     today = datetime.now()
     
     # 如果今天是季報日期，執行訓練
     if today.date() == next_date.date():
-        run_training()
+        run_training(workers, threads_per_worker)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='GAT 季報訓練排程')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='平行訓練各季的行程數 (default: CPU 核心數 / threads-per-worker)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='每個行程使用的 torch 執行緒數 (default: 1)')
+    args = parser.parse_args()
+
     logging.info("啟動排程系統")
     
     # 檢查是否為季報日期
@@ -140,10 +155,10 @@ if __name__ == "__main__":
     
     if today.date() == next_date.date():
         logging.info("今天是季報日期，立即執行訓練")
-        run_training()
+        run_training(args.workers, args.threads_per_worker)
     
     # 執行一次清理
     clean_old_data()
     
     # 開始排程
-    schedule_next_training() 
\ No newline at end of file
+    schedule_next_training(args.workers, args.threads_per_worker) 
\ No newline at end of file
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from edge import extract_edges
+
+
+def tied_matrix(n_nodes=30, seed=0):
+    # few distinct weights, so most edges tie with others, and some missing edges
+    rng = np.random.default_rng(seed)
+    matrix = rng.choice(np.array([0.0, 0.05, 0.1, 0.25, 0.5], dtype=np.float32), size=(n_nodes, n_nodes))
+    matrix[3] = 0.1 # a whole row of ties
+    return matrix
+
+def legacy_edges(matrix, fraction):
+    # the previous edge.py: row-major list of the non-zero entries, stable sort by descending weight, then sliced
+    all_edges = []
+    for i in range(matrix.shape[0]):
+        for j in range(matrix.shape[1]):
+            if matrix[i, j] != 0:
+                all_edges.append((i, j, matrix[i, j]))
+    all_edges.sort(key=lambda x: x[2], reverse=True)
+    top_edges = all_edges[:int(fraction * len(all_edges))]
+    return tuple(np.array([edge[k] for edge in top_edges]) for k in range(3))
+
+@pytest.mark.parametrize('fraction', [0.0, 0.01, 0.3, 0.37, 0.5, 0.999, 1.0])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_fraction_matches_legacy_slicing(fraction, seed):
+    matrix = tied_matrix(seed=seed)
+    rows, cols, weights = extract_edges(matrix, fraction=fraction)
+    expected_rows, expected_cols, expected_weights = legacy_edges(matrix, fraction)
+    np.testing.assert_array_equal(rows, expected_rows.astype(rows.dtype))
+    np.testing.assert_array_equal(cols, expected_cols.astype(cols.dtype))
+    np.testing.assert_array_equal(weights, expected_weights.astype(np.float32))
+
+@pytest.mark.parametrize('top_k', [1, 3, 30, 50])
+def test_top_k_keeps_the_strongest_edges_of_every_row(top_k):
+    matrix = tied_matrix()
+    rows, cols, weights = extract_edges(matrix, top_k=top_k)
+    assert (np.diff(weights) <= 0).all()
+    np.testing.assert_array_equal(weights, matrix[rows, cols])
+    assert len(set(zip(rows.tolist(), cols.tolist()))) == len(rows)
+    for i, row in enumerate(matrix):
+        # which of several tied edges is kept is not specified, their weights are
+        expected = np.sort(row)[::-1][:top_k]
+        np.testing.assert_array_equal(np.sort(weights[rows == i])[::-1], expected[expected != 0])
+
+@pytest.mark.parametrize('percentile', [0, 50, 90, 100])
+def test_percentile_keeps_the_edges_at_or_above_it(percentile):
+    matrix = tied_matrix()
+    rows, cols, weights = extract_edges(matrix, percentile=percentile)
+    nonzero = matrix[matrix != 0]
+    threshold = np.percentile(nonzero, percentile)
+    assert len(weights) == np.count_nonzero(nonzero >= threshold)
+    assert (weights >= threshold).all()
+    np.testing.assert_array_equal(weights, matrix[rows, cols])
+
+def test_combined_filters():
+    matrix = tied_matrix()
+    rows, cols, weights = extract_edges(matrix, top_k=5, fraction=0.5)
+    top_rows, top_cols, top_weights = extract_edges(matrix, top_k=5)
+    # the fraction applies to the edges left by top-k
+    assert len(weights) == int(0.5 * len(top_weights))
+    np.testing.assert_array_equal(weights, top_weights[:len(weights)])
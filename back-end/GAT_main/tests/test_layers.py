@@ -0,0 +1,52 @@
+import pytest
+import torch
+
+from layers import GraphAttentionLayer
+from utils import knn_adjacency
+
+
+def sparse_and_dense_pass(layer, features, adj_mat):
+    """Output, attention and gradients of one forward/backward pass with a sparse and with the dense adjacency."""
+    results = []
+    for adj in (adj_mat, adj_mat.to_dense()):
+        layer.zero_grad()
+        h = features.clone().requires_grad_()
+        output, attention = layer(h, adj, return_attention_weights=True)
+        (output * torch.linspace(-1, 1, output.numel()).view_as(output)).sum().backward()
+        attention = attention.to_dense() if attention.is_sparse else attention
+        results.append((output, attention, h.grad, layer.W.grad.clone(), layer.a.grad.clone()))
+    return results
+
+@pytest.mark.parametrize('concat', [False, True])
+@pytest.mark.parametrize('graph', ['complete', 'top-k'])
+def test_sparse_attention_matches_dense(graph, concat):
+    torch.manual_seed(0)
+    n_nodes = 40
+    features = torch.randn(n_nodes, 6)
+    if graph == 'complete':
+        adj_mat = torch.ones(n_nodes, n_nodes).to_sparse()
+    else:
+        adj_mat = knn_adjacency(features, 5)
+    layer = GraphAttentionLayer(6, 16, n_heads=4, concat=concat).eval() # no dropout, both paths are deterministic
+
+    sparse, dense = sparse_and_dense_pass(layer, features, adj_mat)
+    for name, s, d in zip(['output', 'attention', 'input grad', 'W grad', 'a grad'], sparse, dense):
+        torch.testing.assert_close(s, d, rtol=1e-4, atol=1e-5, msg=name)
+
+def test_attention_mask_follows_in_place_adjacency_edits():
+    torch.manual_seed(0)
+    layer = GraphAttentionLayer(6, 16, n_heads=4).eval()
+    features = torch.randn(12, 6)
+    adj_mat = torch.ones(12, 12)
+    with torch.no_grad():
+        complete = layer(features, adj_mat)
+        assert layer._mask is None # a complete graph needs no mask
+
+        adj_mat[:, 6:] = 0 # the same tensor, edited in place
+        masked = layer(features, adj_mat)
+        expected = layer(features, adj_mat.clone())
+        assert not torch.allclose(masked, complete)
+        torch.testing.assert_close(masked, expected)
+
+        adj_mat.fill_(1)
+        torch.testing.assert_close(layer(features, adj_mat), complete)
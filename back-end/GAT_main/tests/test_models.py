@@ -0,0 +1,65 @@
+import pytest
+import torch
+from torch import nn
+
+from models import GAT
+from train import train_batched, masked_mse
+
+
+def make_gat(n_graphs=None, concat=False):
+    return GAT(in_features=6, n_hidden=8, n_heads=4, num_classes=1, concat=concat, dropout=0.6, n_graphs=n_graphs)
+
+def graph_batch(n_graphs=3, n_nodes=10, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    features = torch.randn(n_graphs, n_nodes, 6, generator=generator)
+    adj_mat = (torch.rand(n_graphs, n_nodes, n_nodes, generator=generator) < 0.6).float()
+    adj_mat[0] = 1 # one complete graph, the others are masked
+    adj_mat[:, torch.arange(n_nodes), torch.arange(n_nodes)] = 1
+    return features, adj_mat
+
+@pytest.mark.parametrize('concat', [False, True])
+def test_batched_output_matches_single_graph_models(concat):
+    torch.manual_seed(0)
+    batched = make_gat(n_graphs=3, concat=concat).eval()
+    features, adj_mat = graph_batch()
+    with torch.no_grad():
+        output, attention = batched(features, adj_mat)
+
+    for g in range(3):
+        single = make_gat(concat=concat).eval()
+        # the parameters of graph g are the g-th slice of every batched parameter
+        single.load_state_dict({name: value[g] for name, value in batched.state_dict().items()})
+        with torch.no_grad():
+            single_output, single_attention = single(features[g], adj_mat[g])
+        torch.testing.assert_close(output[g], single_output)
+        torch.testing.assert_close(attention[g], single_attention)
+
+def test_batched_gradients_stay_per_graph():
+    torch.manual_seed(0)
+    batched = make_gat(n_graphs=3).eval()
+    features, adj_mat = graph_batch()
+    target = torch.randn(3, 10)
+    output, _ = batched(features, adj_mat)
+    masked_mse(output.squeeze(-1), target, torch.ones(3, 10, dtype=torch.bool)).sum().backward()
+
+    for g in range(3):
+        single = make_gat().eval()
+        single.load_state_dict({name: value[g] for name, value in batched.state_dict().items()})
+        single_output, _ = single(features[g], adj_mat[g])
+        nn.MSELoss()(single_output.squeeze(-1), target[g]).backward()
+        for (name, parameter), single_parameter in zip(batched.named_parameters(), single.parameters()):
+            torch.testing.assert_close(parameter.grad[g], single_parameter.grad, msg=name)
+
+def test_train_batched_keeps_the_output_of_the_best_epoch():
+    torch.manual_seed(0)
+    model = make_gat(n_graphs=3)
+    features, adj_mat = graph_batch()
+    target = torch.randn(3, 10)
+    mask_train = torch.zeros(3, 10, dtype=torch.bool)
+    mask_train[:, :6] = True
+    mask_val = ~mask_train
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.05)
+    _, best_output, min_loss_val, _, _, val_losses = train_batched(
+        model, optimizer, (features, adj_mat), target, mask_train, mask_val, epochs=30, log_every=10**9)
+    torch.testing.assert_close(masked_mse(best_output, target, mask_val), min_loss_val)
+    torch.testing.assert_close(min_loss_val, val_losses.min(dim=0).values)
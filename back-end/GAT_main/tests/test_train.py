@@ -0,0 +1,57 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import train
+import utils
+
+
+def make_panel(n_quarters=4, n_nodes=80, seed=0):
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(n_quarters, n_nodes, len(utils.FEATURE_COLS)))
+    features[2] = features[1] # two quarters with the same data
+    labels = rng.normal(size=(n_quarters, n_nodes))
+    labels[2] = labels[1]
+    return {
+        'features': features, 'labels': labels,
+        'dates': np.array([f'2020-0{q + 1}-15' for q in range(n_quarters)]),
+        'stock_codes': np.array([str(1000 + i) for i in range(n_nodes)]),
+    }
+
+def make_args(**kwargs):
+    args = dict(seed=13, epochs=3, lr=0.005, l2=5e-4, dropout_p=0.6, hidden_dim=8, num_heads=2, concat_heads=False,
+                top_k=None, val_every=10**9, eval_every=1, dry_run=False, patience=0, min_delta=0.0, lr_patience=0,
+                lr_factor=0.5, save_npy=False, compile=False, train_frac=0.81, val_frac=0.11)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+@pytest.fixture
+def worker_panel(tmp_path, monkeypatch):
+    # fit_quarter writes the attention matrices to output/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'output').mkdir()
+    panel = make_panel()
+    monkeypatch.setattr(train, '_worker_panel', panel)
+    return panel
+
+def test_worker_quarters_are_seeded_by_date(worker_panel):
+    args = make_args()
+    forward = {r['date']: r['loss_test'] for r in (train._fit_quarter_worker(graph, args) for graph in (1, 2, 3))}
+    backward = {r['date']: r['loss_test'] for r in (train._fit_quarter_worker(graph, args) for graph in (3, 2, 1))}
+    # independent of the order (or the worker) the quarters are fitted in
+    assert forward == backward
+    # quarters with the same data still get their own initialization and node split
+    assert forward['2020-02-15'] != forward['2020-03-15']
+
+@pytest.mark.parametrize('n_nodes, expected', [(74, (60, 8)), (1800, (1458, 198))])
+def test_split_is_proportional_to_the_graph(n_nodes, expected):
+    assert train.split_sizes(n_nodes, 0.81, 0.11) == expected
+    mask_train, mask_val, mask_test = train.split_masks(2, n_nodes)
+    assert mask_train.sum(dim=1).tolist() == [expected[0]] * 2
+    assert mask_val.sum(dim=1).tolist() == [expected[1]] * 2
+    assert (mask_train ^ mask_val ^ mask_test).all()
+
+def test_split_needs_test_nodes():
+    with pytest.raises(ValueError):
+        train.split_sizes(10, 0.8, 0.2)
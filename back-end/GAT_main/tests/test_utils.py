@@ -0,0 +1,51 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def write_stock_csvs(data_dir, n_stocks=3, n_quarters=5, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-05-15', periods=n_quarters, freq='QS-FEB').strftime('%Y-%m-%d')
+    for i in range(n_stocks):
+        df = pd.DataFrame(rng.normal(size=(n_quarters, len(utils.FEATURE_COLS))), columns=utils.FEATURE_COLS)
+        df.insert(0, 'date', dates)
+        df['sharpe_ratio'] = rng.normal(size=n_quarters)
+        df.to_csv(data_dir / f'{1000 + i}.csv', index=False)
+
+
+def test_second_load_is_served_from_cache(tmp_path, monkeypatch):
+    write_stock_csvs(tmp_path)
+    first = utils.load_panel(str(tmp_path))
+    assert first['dates'].dtype.kind == 'U'
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the CSV files were parsed again instead of loading the cache')
+
+    monkeypatch.setattr(utils.pd, 'read_csv', fail)
+    second = utils.load_panel(str(tmp_path))
+    for key in ('features', 'labels', 'dates', 'stock_codes'):
+        np.testing.assert_array_equal(first[key], second[key])
+
+
+def test_cache_is_rebuilt_when_a_source_changes(tmp_path):
+    write_stock_csvs(tmp_path)
+    utils.load_panel(str(tmp_path))
+    write_stock_csvs(tmp_path, seed=1)
+    expected = pd.read_csv(tmp_path / '1000.csv')['sharpe_ratio'].to_numpy()
+    # the rewritten files may keep the same mtime on coarse-grained file systems
+    for path in tmp_path.glob('*.csv'):
+        stat = path.stat()
+        utils.os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    np.testing.assert_array_equal(utils.load_panel(str(tmp_path))['labels'][:, 0], expected)
+
+
+def test_unreadable_cache_is_rebuilt(tmp_path, capsys):
+    write_stock_csvs(tmp_path)
+    expected = utils.load_panel(str(tmp_path))
+    (tmp_path / utils.PANEL_CACHE).write_bytes(b'not a zip file')
+    np.testing.assert_array_equal(utils.load_panel(str(tmp_path))['features'], expected['features'])
+    assert 'Ignoring unreadable panel cache' in capsys.readouterr().out
+    assert zipfile.is_zipfile(tmp_path / utils.PANEL_CACHE)
@@ -6,21 +6,24 @@ import numpy as np
 import argparse
 import pandas as pd
 import glob
+import json
+import zlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 from models import GAT
-from utils import load_cora
+from utils import load_cora, load_panel, quarter_hash, knn_adjacency, FEATURE_COLS
 import matplotlib.pyplot as plt
 import torch
 from torch import nn
 import torch.nn.functional as F
 from torch.optim import Adam
+from torch.optim.lr_scheduler import ReduceLROnPlateau
 
 #################################
 ### TRAIN AND TEST FUNCTIONS  ###
 #################################
 
-min_loss_val = 0
-
 def test(model, criterion, input, target, mask):
     model.eval()
     with torch.no_grad():
@@ -31,10 +34,25 @@ def test(model, criterion, input, target, mask):
         loss = criterion(output, target)
     return loss.item()
     
-def train_iter(epoch, model, optimizer, criterion, input, target, mask_train, mask_val, stock_codes, F_date, print_every=10):
+def evaluate(model, criterion, input, target, masks):
+    """Computes the loss on every mask from a single eval-mode forward pass and returns them with the attention."""
+    model.eval()
+    with torch.no_grad():
+        output, edge = model(*input)
+        output = output.squeeze(1)
+        losses = [criterion(output[mask], target[mask]).item() for mask in masks]
+    return losses, edge
 
-    global min_loss_val
-    
+def train_iter(epoch, model, optimizer, criterion, input, target, mask_train, mask_val, checkpoint, log_every=200, evaluate_epoch=True):
+    """
+    Runs one training step and, when `evaluate_epoch` is set, evaluates the train and validation loss.
+
+    Whenever the validation loss improves, the attention matrix and a copy of the model state are kept
+    in memory in `checkpoint` (keys `loss_val`, `epoch`, `attention`, `model_state`), nothing is written to disk.
+
+    Returns:
+        tuple: (loss_train, loss_val), both None for epochs that were not evaluated.
+    """
     start_t = time.time()
     model.train()
     optimizer.zero_grad()
@@ -49,38 +67,392 @@ def train_iter(epoch, model, optimizer, criterion, input, target, mask_train, ma
     loss.backward()
     optimizer.step()
 
-    # Evaluate the model performance on training and validation sets
-    loss_train = test(model, criterion, input, target, mask_train)
-    loss_val = test(model, criterion, input, target, mask_val)
+    if not evaluate_epoch:
+        return None, None
 
-    
-    if epoch % (print_every*10) == 0:
+    # Evaluate the model performance on training and validation sets with one forward pass,
+    # the attention of that same pass is the snapshot kept for the best epoch
+    (loss_train, loss_val), edge = evaluate(model, criterion, input, target, (mask_train, mask_val))
+
+    if epoch % log_every == 0:
         # Print the training progress at specified intervals
         print(f'Epoch: {epoch:04d} ({(time.time() - start_t):.4f}s) loss_train: {loss_train:.4f}  loss_val: {loss_val:.4f} ')
 
-    if epoch ==1:
-        min_loss_val = loss_val
-        
-    if loss_val <  min_loss_val or epoch == 1:
-        min_loss_val = loss_val
-        numpy_array = edge.detach().cpu().numpy()
-        # 重塑numpy_array為二維數組
-        reshaped_array = numpy_array.reshape(-1, numpy_array.shape[2])
-        df = pd.DataFrame(reshaped_array)
-        
-        df.columns = stock_codes
-        
-        file_name = f'output/tensor_epoch_{F_date}.csv'
-        df.to_csv(file_name, index=False)
+    if not checkpoint or loss_val < checkpoint['loss_val']:
+        checkpoint['loss_val'] = loss_val
+        checkpoint['epoch'] = epoch
+        checkpoint['attention'] = edge.detach().clone()
+        checkpoint['model_state'] = {k: v.detach().clone() for k, v in model.state_dict().items()}
         
     return loss_train, loss_val
 
-def get_dates_from_csv():
-    # 讀取第一個股票文件來獲取日期
-    first_stock_file = glob.glob("./data/*.csv")[0]  # 獲取第一個CSV文件
-    df = pd.read_csv(first_stock_file)
-    dates = df['date'].unique().tolist()  # 獲取所有不重複的日期
-    return dates
+class EarlyStopping:
+    """
+    Patience-based early stopping on the validation loss.
+
+    `step` is called once per evaluation with a scalar loss, or a (n_graphs,) tensor of losses in batched
+    mode, and returns True once no loss has improved by more than `min_delta` for `patience` evaluations.
+    A patience of 0 disables early stopping.
+    """
+    def __init__(self, patience=0, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = None
+        self.bad_evaluations = None
+
+    def step(self, loss_val):
+        loss_val = torch.as_tensor(loss_val, dtype=torch.float)
+        if self.best is None:
+            self.best = loss_val.clone()
+            self.bad_evaluations = torch.zeros_like(loss_val, dtype=torch.long)
+        else:
+            improved = loss_val < self.best - self.min_delta
+            self.best = torch.where(improved, loss_val, self.best)
+            self.bad_evaluations = torch.where(improved, torch.zeros_like(self.bad_evaluations), self.bad_evaluations + 1)
+        return self.patience > 0 and bool((self.bad_evaluations >= self.patience).all())
+
+def build_optimizer(model, args):
+    """Creates a fresh Adam optimizer and, with `--lr-patience`, a plateau learning rate scheduler for it."""
+    optimizer = Adam(model.parameters(), lr=args.lr, weight_decay=args.l2)
+    scheduler = None
+    if args.lr_patience > 0:
+        scheduler = ReduceLROnPlateau(optimizer, mode='min', factor=args.lr_factor, patience=args.lr_patience,
+                                      threshold=args.min_delta, threshold_mode='abs')
+    return optimizer, scheduler
+
+def save_attention(edge, stock_codes, F_date, save_npy=False):
+    """
+    Writes one quarter's attention matrix to `output/tensor_epoch_<date>.csv`, and with `save_npy`
+    also as a compact float32 `output/tensor_epoch_<date>.npy` next to it.
+    """
+    if edge.is_sparse:
+        edge = edge.to_dense()
+    numpy_array = edge.detach().cpu().numpy()
+    # 重塑numpy_array為二維數組
+    reshaped_array = numpy_array.reshape(-1, numpy_array.shape[-1])
+    df = pd.DataFrame(reshaped_array)
+    
+    df.columns = stock_codes
+    
+    file_name = f'output/tensor_epoch_{F_date}.csv'
+    # 先寫入暫存檔再取代，讀取端（app.py、其他 worker）不會看到寫到一半的檔案
+    tmp_name = f'{file_name}.{os.getpid()}.tmp'
+    df.to_csv(tmp_name, index=False)
+    os.replace(tmp_name, file_name)
+
+    if save_npy:
+        npy_name = f'output/tensor_epoch_{F_date}.npy'
+        tmp_name = f'{npy_name}.{os.getpid()}.tmp'
+        with open(tmp_name, 'wb') as f:
+            np.save(f, reshaped_array.astype(np.float32))
+        os.replace(tmp_name, npy_name)
+
+def split_sizes(n_nodes, train_frac, val_frac):
+    """
+    Numbers of train and validation nodes, proportional to the size of the graph; the remaining nodes are test nodes.
+    The default fractions keep the 60 / 8 / 6 split of the 74-stock universe.
+    """
+    n_train = max(1, int(round(n_nodes * train_frac)))
+    n_val = max(1, int(round(n_nodes * val_frac)))
+    if n_train + n_val >= n_nodes:
+        raise ValueError(f'a graph of {n_nodes} nodes has no test nodes left with train fraction {train_frac} and validation fraction {val_frac}')
+    return n_train, n_val
+
+def split_masks(n_graphs, n_nodes, device='cpu', train_frac=0.81, val_frac=0.11):
+    """Draws an independent train/val/test node split for every graph, as boolean masks of shape (n_graphs, n_nodes)."""
+    n_train, n_val = split_sizes(n_nodes, train_frac, val_frac)
+    masks = torch.zeros((3, n_graphs, n_nodes), dtype=torch.bool, device=device)
+    for g in range(n_graphs):
+        idx = torch.randperm(n_nodes).to(device)
+        masks[0, g, idx[:n_train]] = True
+        masks[1, g, idx[n_train:n_train + n_val]] = True
+        masks[2, g, idx[n_train + n_val:]] = True
+    return masks[0], masks[1], masks[2]
+
+def masked_mse(output, target, mask):
+    """Per-graph mean squared error over the masked nodes of a (n_graphs, n_nodes) batch."""
+    squared_error = torch.where(mask, (output - target) ** 2, torch.zeros_like(output))
+    return squared_error.sum(dim=-1) / mask.sum(dim=-1)
+
+def train_batched(model, optimizer, input, target, mask_train, mask_val, epochs, log_every=200, dry_run=False, eval_every=1,
+                  scheduler=None, early_stopping=None):
+    """
+    Trains a batch of quarterly graphs together in one vectorized forward/backward pass per epoch.
+
+    The summed per-graph losses keep the gradients of graphs with their own parameters independent,
+    and Adam updates every parameter element-wise, so a single optimizer behaves as one per graph.
+    The plateau scheduler follows the summed validation loss, and early stopping ends training once
+    every graph has stopped improving.
+
+    The attention and the evaluation output of every graph are kept from its best validation epoch, so the
+    test loss can be computed from the same state as its minimum validation loss (as `fit_quarter` does by
+    restoring the best model state).
+
+    Returns:
+        tuple: best attention per graph (n_graphs, 1, n_nodes, n_nodes), per-graph output of the best epoch
+            (n_graphs, n_nodes), per-graph minimum validation loss, the evaluated epochs and their (n_graphs,)
+            train/val loss histories.
+    """
+    best_attention = None
+    best_output = None
+    min_loss_val = None
+    eval_epochs, train_losses, val_losses = [], [], []
+
+    for epoch in range(1, epochs + 1):
+        start_t = time.time()
+        model.train()
+        optimizer.zero_grad()
+
+        output, edge = model(*input)
+        loss = masked_mse(output.squeeze(-1), target, mask_train).sum()
+        loss.backward()
+        optimizer.step()
+
+        if epoch % eval_every != 0 and epoch not in (1, epochs) and not dry_run:
+            continue
+
+        model.eval()
+        with torch.no_grad():
+            output, edge = model(*input)
+            output = output.squeeze(-1)
+            loss_train = masked_mse(output, target, mask_train)
+            loss_val = masked_mse(output, target, mask_val)
+
+        if best_attention is None:
+            best_attention = edge.clone()
+            best_output = output.clone()
+            min_loss_val = loss_val.clone()
+        else:
+            improved = loss_val < min_loss_val
+            best_attention[improved] = edge[improved]
+            best_output[improved] = output[improved]
+            min_loss_val = torch.where(improved, loss_val, min_loss_val)
+
+        eval_epochs.append(epoch)
+        train_losses.append(loss_train.cpu())
+        val_losses.append(loss_val.cpu())
+
+        if epoch % log_every == 0:
+            print(f'Epoch: {epoch:04d} ({(time.time() - start_t):.4f}s) loss_train: {loss_train.mean():.4f}  loss_val: {loss_val.mean():.4f} (mean over {len(loss_val)} graphs)')
+        if scheduler is not None:
+            scheduler.step(loss_val.sum().item())
+        if early_stopping is not None and early_stopping.step(loss_val.cpu()):
+            print(f'Early stopping at epoch {epoch}: no graph improved for {early_stopping.patience} evaluations')
+            break
+        if dry_run:
+            break
+
+    return best_attention, best_output, min_loss_val, eval_epochs, torch.stack(train_losses), torch.stack(val_losses)
+
+def read_data(panel, index, device='cpu', top_k=None):
+    """
+    Slices one quarter out of the stock panel and z-scores every column across the stocks.
+
+    The adjacency matrix is the complete graph over the stocks, or a sparse graph linking every stock
+    to its `top_k` most similar stocks when `top_k` is given.
+    """
+    feature = panel['features'][index]
+    label = panel['labels'][index]
+
+    # 與 pandas 的 mean()/std() 一致：忽略 NaN，std 使用 ddof=1
+    feature = (feature - np.nanmean(feature, axis=0)) / np.nanstd(feature, axis=0, ddof=1)
+    label = (label - np.nanmean(label)) / np.nanstd(label, ddof=1)
+
+    n_nodes = feature.shape[0]
+    feature_tensor = torch.tensor(feature, dtype=torch.float, device=device)
+    label_tensor = torch.tensor(label, dtype=torch.float, device=device)
+    if top_k:
+        adj_mat = knn_adjacency(feature_tensor, top_k)
+    else:
+        adj_mat = torch.ones((n_nodes, n_nodes), device=device)
+
+    return feature_tensor, label_tensor, adj_mat
+
+def build_model(args, device, n_graphs=None):
+    """Creates the 2-layer GAT described by the command line arguments, optionally compiled with torch.compile."""
+    model = GAT(
+        in_features=len(FEATURE_COLS),          # Number of input features per node  
+        n_hidden=args.hidden_dim,               # Output size of the first Graph Attention Layer
+        n_heads=args.num_heads,                 # Number of attention heads in the first Graph Attention Layer
+        num_classes=1,                          # Number of classes to predict for each node
+        concat=args.concat_heads,               # Wether to concatinate attention heads
+        dropout=args.dropout_p,                 # Dropout rate
+        leaky_relu_slope=0.2,                   # Alpha (slope) of the leaky relu activation
+        n_graphs=n_graphs                       # Number of graphs with their own parameters (batched mode)
+    ).to(device)
+    if getattr(args, 'compile', False):
+        model = torch.compile(model)
+    return model
+
+def fit_quarter(model, criterion, panel, graph, args, device):
+    """
+    Trains `model` on one quarter's graph and returns the loss summary.
+
+    Every quarter gets a fresh optimizer (and plateau scheduler), and training stops early once the
+    validation loss has not improved by `--min-delta` for `--patience` evaluations.
+
+    The best attention matrix and model state are tracked in memory; at the end of the quarter the model is
+    restored to its best state for the test evaluation and the attention matrix is written once.
+    """
+    stock_codes = panel['stock_codes'].tolist()
+    F_date = str(panel['dates'][graph])
+    print(f"第{graph}筆的資料: {F_date}")
+
+    features, labels, adj_mat = read_data(panel, graph, device, args.top_k)
+
+    # 創建並移動索引，依節點數比例切分
+    n_train, n_val = split_sizes(len(labels), args.train_frac, args.val_frac)
+    idx = torch.randperm(len(labels)).to(device)
+    idx_train, idx_val, idx_test = idx[:n_train], idx[n_train:n_train + n_val], idx[n_train + n_val:]
+
+    optimizer, scheduler = build_optimizer(model, args)
+    early_stopping = EarlyStopping(args.patience, args.min_delta)
+
+    # 初始化損失列表（只記錄有評估的 epoch）與最佳 checkpoint
+    checkpoint = {}
+    eval_epochs = []
+    train_losses = []
+    val_losses = []
+
+    # Train and evaluate the model, every `eval_every` epochs plus the first and the last one
+    start_t = time.time()
+    for epoch in range(1, args.epochs + 1):
+        evaluate_epoch = epoch % args.eval_every == 0 or epoch in (1, args.epochs) or args.dry_run
+        loss_train, loss_val = train_iter(epoch, model, optimizer, criterion, (features, adj_mat), labels, idx_train, idx_val, checkpoint,
+                                          args.val_every * 10, evaluate_epoch)
+        if evaluate_epoch:
+            eval_epochs.append(epoch)
+            train_losses.append(loss_train)
+            val_losses.append(loss_val)
+            if scheduler is not None:
+                scheduler.step(loss_val)
+            if early_stopping.step(loss_val):
+                break
+        if args.dry_run:
+            break
+
+    # 實際使用的 epoch 數，以及依平均每個 epoch 的時間估計省下的時間
+    epochs_used = epoch
+    train_time = time.time() - start_t
+    time_saved = train_time / epochs_used * (args.epochs - epochs_used)
+    print(f'Used {epochs_used}/{args.epochs} epochs in {train_time:.2f}s '
+          f'(early stopping saved ~{time_saved:.2f}s, final lr {optimizer.param_groups[0]["lr"]:.2e})')
+
+    # 回到驗證損失最低的狀態，並只在季度結束時寫一次檔案
+    model.load_state_dict(checkpoint['model_state'])
+    save_attention(checkpoint['attention'], stock_codes, F_date, args.save_npy)
+
+    loss_test = test(model, criterion, (features, adj_mat), labels, idx_test)
+    print(f'Test set results: loss {loss_test:.4f}')
+
+    # 獲得最小訓練損失及其對應的epoch
+    min_train_loss_epoch = eval_epochs[train_losses.index(min(train_losses))]
+    min_train_loss = min(train_losses)
+
+    # 獲得最小驗證損失及其對應的epoch
+    min_val_loss_epoch = eval_epochs[val_losses.index(min(val_losses))]
+    min_val_loss = min(val_losses)
+
+    print(f"Minimum training loss of {min_train_loss} occurred at epoch {min_train_loss_epoch}.")
+    print(f"Minimum validation loss of {min_val_loss} occurred at epoch {min_val_loss_epoch}.")
+
+    return {'graph': graph, 'date': F_date, 'loss_test': loss_test,
+            'min_train_loss': min_train_loss, 'min_val_loss': min_val_loss,
+            'epochs_used': epochs_used, 'train_time': train_time, 'time_saved': time_saved}
+
+#################################
+###   INCREMENTAL RETRAINING  ###
+#################################
+
+MANIFEST_PATH = 'output/manifest.json'
+
+# 影響訓練結果的超參數，任一項改變都需要重新訓練
+HPARAM_KEYS = ['epochs', 'lr', 'l2', 'dropout_p', 'hidden_dim', 'num_heads', 'concat_heads', 'seed', 'top_k', 'eval_every',
+               'patience', 'min_delta', 'lr_patience', 'lr_factor', 'train_frac', 'val_frac']
+
+# 只有各季度獨立訓練的模式可以跳過季度：serial 模式延續上一季的模型權重與亂數；
+# batched 模式的季度共用學習率排程（驗證損失總和）與提前停止，初始化與資料切分也取自同一個亂數序列，
+# 一季的結果取決於同一批訓練的其他季度；batched-shared 模式所有季度更共用參數
+INCREMENTAL_MODES = ['independent']
+
+def training_hparams(args):
+    """The hyperparameters recorded in the manifest, including the training mode."""
+    hparams = {key: getattr(args, key) for key in HPARAM_KEYS}
+    if args.batched:
+        hparams['mode'] = 'batched-shared' if args.share_weights else 'batched'
+    else:
+        hparams['mode'] = 'independent' if args.workers > 0 else 'serial'
+    return hparams
+
+def load_manifest(path=MANIFEST_PATH):
+    """Reads the `{date: {'hash', 'hparams', 'min_val_loss', 'loss_test'}}` manifest of already trained quarters."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_up_to_date(manifest, panel, graph, hparams):
+    """True when the quarter's output exists and was trained on the same data with the same hyperparameters."""
+    F_date = str(panel['dates'][graph])
+    entry = manifest.get(F_date)
+    return (entry is not None
+            and os.path.exists(f'output/tensor_epoch_{F_date}.csv')
+            and entry.get('hash') == quarter_hash(panel, graph)
+            and entry.get('hparams') == hparams)
+
+def record_quarter(manifest, panel, graph, hparams, min_val_loss=None, loss_test=None):
+    # the losses are not part of the up-to-date check, the back end shows them in the date picker (/api/dates?meta=1)
+    manifest[str(panel['dates'][graph])] = {'hash': quarter_hash(panel, graph), 'hparams': hparams,
+                                            'min_val_loss': min_val_loss, 'loss_test': loss_test}
+
+#################################
+###    PARALLEL QUARTER FITS  ###
+#################################
+
+_worker_panel = None
+
+def _init_worker(panel, threads):
+    """Pins the torch thread pools of a worker process so the pool does not oversubscribe the cores."""
+    global _worker_panel
+    _worker_panel = panel
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        pass # inter-op pool already started in this process
+
+def quarter_seed(seed, F_date):
+    """Seed of one quarter's initialization and node split, derived from its date so it does not depend on the worker or on the other quarters."""
+    return seed + zlib.crc32(str(F_date).encode('utf-8'))
+
+def _fit_quarter_worker(graph, args):
+    # every quarter gets its own seeded initialization and split, independent of which worker runs it
+    torch.manual_seed(quarter_seed(args.seed, _worker_panel['dates'][graph]))
+    device = torch.device('cpu')
+    model = build_model(args, device)
+    return fit_quarter(model, nn.MSELoss(), _worker_panel, graph, args, device)
+
+def train_parallel(panel, quarters, args, workers, threads_per_worker=1):
+    """
+    Fits every quarter in `quarters` with an independently initialized model on a pool of `workers` processes.
+
+    Returns:
+        list: the loss summaries returned by `fit_quarter`, in the order of `quarters`.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(panel, threads_per_worker)) as pool:
+        futures = [pool.submit(_fit_quarter_worker, graph, args) for graph in quarters]
+        return [future.result() for future in futures]
 
 if __name__ == '__main__':
 
@@ -102,8 +474,14 @@ if __name__ == '__main__':
                         help='number of the attention heads (default: 4)')
     parser.add_argument('--concat-heads', action='store_true', default=False,
                         help='wether to concatinate attention heads, or average over them (default: False)')
+    parser.add_argument('--train-frac', type=float, default=0.81,
+                        help='fraction of the stocks of every quarter used as training nodes (default: 0.81)')
+    parser.add_argument('--val-frac', type=float, default=0.11,
+                        help='fraction of the stocks of every quarter used as validation nodes, the rest are test nodes (default: 0.11)')
     parser.add_argument('--val-every', type=int, default=20,
-                        help='epochs to wait for print training and validation evaluation (default: 20)')
+                        help='epochs to wait for print training and validation evaluation, printed every 10x this many epochs (default: 20)')
+    parser.add_argument('--eval-every', type=int, default=1,
+                        help='evaluate the training and validation loss every this many epochs (default: 1)')
     parser.add_argument('--no-cuda', action='store_true', default=False,
                         help='disables CUDA training')
     parser.add_argument('--no-mps', action='store_true', default=False,
@@ -112,7 +490,35 @@ if __name__ == '__main__':
                         help='quickly check a single pass')
     parser.add_argument('--seed', type=int, default=13, metavar='S',
                         help='random seed (default: 13)')
+    parser.add_argument('--patience', type=int, default=0,
+                        help='stop a quarter after this many evaluations without validation improvement, 0 disables (default: 0)')
+    parser.add_argument('--min-delta', type=float, default=0.0,
+                        help='minimum decrease of the validation loss that counts as an improvement (default: 0.0)')
+    parser.add_argument('--lr-patience', type=int, default=0,
+                        help='reduce the learning rate after this many evaluations without improvement, 0 disables (default: 0)')
+    parser.add_argument('--lr-factor', type=float, default=0.5,
+                        help='factor the learning rate is multiplied by on a plateau (default: 0.5)')
+    parser.add_argument('--batched', action='store_true', default=False,
+                        help='train all quarterly graphs together in one batched forward pass (default: False)')
+    parser.add_argument('--share-weights', action='store_true', default=False,
+                        help='in batched mode, share one set of parameters and optimizer state across all quarters (default: False)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='fit the quarters on a pool of this many CPU worker processes, 0 trains them serially (default: 0)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='torch threads used by each worker process (default: 1)')
+    parser.add_argument('--top-k', type=int, default=None,
+                        help='sparse attention over the k most similar stocks instead of the complete graph (default: None)')
+    parser.add_argument('--save-npy', action='store_true', default=False,
+                        help='also store each attention matrix as a float32 .npy next to the CSV (default: False)')
+    parser.add_argument('--compile', action='store_true', default=False,
+                        help='compile the model with torch.compile (default: False)')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='retrain every quarter, even those whose data and hyperparameters are unchanged')
     args = parser.parse_args()
+    if args.batched and args.top_k:
+        parser.error('--top-k sparse attention is not supported together with --batched')
+    if not (0 < args.train_frac and 0 < args.val_frac and args.train_frac + args.val_frac < 1):
+        parser.error('--train-frac and --val-frac must be positive and sum to less than 1')
 
     torch.manual_seed(args.seed)
     use_cuda = not args.no_cuda and torch.cuda.is_available()
@@ -127,142 +533,81 @@ if __name__ == '__main__':
         device = torch.device('cpu')
     print(f'Using {device} device')
 
-    def read_data(file_paths,index):
-        feature_cols = ["CostOfGoodsSold",	
-                        "EPS",
-                        "IncomeAfterTaxes",
-                        "IncomeFromContinuingOperations",
-                        "OtherComprehensiveIncome",
-                        "Revenue",	
-                        "TAX",
-                        "TotalConsolidatedProfitForThePeriod",
-                        "CapitalStock",		
-                        "CapitalSurplus",		
-                        "CashAndCashEquivalents",	
-                        "CurrentAssets",	
-                        "Equity",	
-                        "NoncurrentAssets",	
-                        "NoncurrentLiabilities",	
-                        "OrdinaryShare",	
-                        "OtherCurrentLiabilities",	
-                        "OtherEquityInterest",	
-                        "RetainedEarnings",	
-                        "TotalAssets",	
-                        "CashBalancesBeginningOfPeriod",	
-                        "CashBalancesEndOfPeriod",	
-                        "Depreciation",	
-                        "PayTheInterest",	
-                        "PropertyAndPlantAndEquipment" ]
-                        
-        label_cols = ["sharpe_ratio"]
-        
-        feature = pd.DataFrame()
-        label = pd.DataFrame()
-        
-        file_paths.sort()  # 确保文件按字母顺序读取
-        
-        feature_tensor = torch.tensor([], dtype=torch.float)  # 初始化为空Tensor
-        label_tensor = torch.tensor([], dtype=torch.float)  # 初始化为空Tensor
-        adj_mat = torch.tensor([], dtype=torch.float)  # 如果你需要重新初始化adj_mat
-    
-    
-        for files in file_paths:
-            for f in files:
-                feature_csv = pd.read_csv(f, usecols=feature_cols).iloc[index:index+1]
-                feature = pd.concat([feature, feature_csv], ignore_index=True)
-                
-                label_csv = pd.read_csv(f, usecols=label_cols).iloc[index:index+1]
-                label = pd.concat([label, label_csv], ignore_index=True)
-        
-        #for col in feature_cols:
-        #    feature[col] = (feature[col] - feature[col].min()) / (feature[col].max() - feature[col].min())
-        #for col in label_cols:
-        #    label[col] = (label[col] - label[col].min()) / (label[col].max() - label[col].min())
-    
-        for col in feature_cols:
-            feature[col] = (feature[col] - feature[col].mean()) / feature[col].std()
-        for col in label_cols:
-            label[col] = (label[col] - label[col].mean()) / label[col].std()
-    
-        feature_tensor = torch.tensor(feature.values.astype(float))
-        
-        label_tensor = torch.tensor(label.values.astype(float)).squeeze()
-        
-        adj_mat = torch.ones((74, 74))
-    
-        # 將所有張量移到同一個設備上
-        feature_tensor = feature_tensor.float().to(device)
-        adj_mat = adj_mat.float().to(device)
-        label_tensor = label_tensor.float().to(device)
-
-        return feature_tensor, label_tensor, adj_mat
- 
+    panel = load_panel('./data')
 
-    file_paths = [glob.glob("./data/*.csv")]
-    
     # 取得股票代號清單
-    stock_codes = [os.path.basename(file).split('.')[0] for file in file_paths[0]]
-    
-    # 替換原來的 date.txt 讀取方式
-    dates = get_dates_from_csv()
+    stock_codes = panel['stock_codes'].tolist()
+
+    dates = panel['dates'].tolist()
     print(dates)
     
-    # Create the model
-    # The model consists of a 2-layer stack of Graph Attention Layers (GATs).
-    gat_net = GAT(
-        in_features=25,#features.shape[1],          # Number of input features per node  
-        n_hidden=args.hidden_dim,               # Output size of the first Graph Attention Layer
-    	n_heads=args.num_heads,                 # Number of attention heads in the first Graph Attention Layer
-    	num_classes=1,#labels.max().item() + 1,    # Number of classes to predict for each node
-    	concat=args.concat_heads,               # Wether to concatinate attention heads
-    	dropout=args.dropout_p,                 # Dropout rate
-    	leaky_relu_slope=0.2                    # Alpha (slope) of the leaky relu activation
-    ).to(device)
+    # 第0筆沒有 sharpe_ratio 標籤，從第1筆開始訓練
+    quarters = list(range(1, len(dates)))
+
+    # 只重新訓練資料或超參數有變動的季度
+    hparams = training_hparams(args)
+    manifest = load_manifest()
+    if not args.force and hparams['mode'] not in INCREMENTAL_MODES:
+        print(f"The quarters of {hparams['mode']} training depend on each other, retraining all of them "
+              f"(use --workers to retrain only changed quarters).")
+    elif not args.force:
+        skipped = [dates[graph] for graph in quarters if is_up_to_date(manifest, panel, graph, hparams)]
+        quarters = [graph for graph in quarters if dates[graph] not in skipped]
+        if skipped:
+            print(f'Skipping {len(skipped)} up-to-date quarters: {skipped}')
+
+    if not quarters:
+        print('All quarters are up to date, nothing to train (use --force to retrain).')
+    elif args.batched:
+        batch = [read_data(panel, graph, device) for graph in quarters]
+        features = torch.stack([b[0] for b in batch])
+        labels = torch.stack([b[1] for b in batch])
+        adj_mat = torch.stack([b[2] for b in batch])
+        mask_train, mask_val, mask_test = split_masks(len(quarters), labels.shape[-1], device, args.train_frac, args.val_frac)
+
+        gat_net = build_model(args, device, n_graphs=None if args.share_weights else len(quarters))
+        optimizer, scheduler = build_optimizer(gat_net, args)
+
+        start_t = time.time()
+        best_attention, best_output, min_loss_val, eval_epochs, train_losses, val_losses = train_batched(
+            gat_net, optimizer, (features, adj_mat), labels, mask_train, mask_val, args.epochs, args.val_every * 10, args.dry_run, args.eval_every,
+            scheduler, EarlyStopping(args.patience, args.min_delta))
+        print(f'Trained {len(quarters)} quarters in {(time.time() - start_t):.2f}s')
+
+        # 以每個季度驗證損失最低那個 epoch 的輸出計算測試損失
+        loss_test = masked_mse(best_output, labels, mask_test)
+
+        for i, graph in enumerate(quarters):
+            F_date = dates[graph]
+            save_attention(best_attention[i], stock_codes, F_date, args.save_npy)
+            min_val_loss_epoch = eval_epochs[val_losses[:, i].argmin().item()]
+            print(f"第{graph}筆的資料: {F_date} test loss {loss_test[i]:.4f}, "
+                  f"minimum validation loss of {min_loss_val[i]:.4f} occurred at epoch {min_val_loss_epoch}.")
+            record_quarter(manifest, panel, graph, hparams, min_loss_val[i].item(), loss_test[i].item())
+    elif args.workers > 0:
+        start_t = time.time()
+        results = train_parallel(panel, quarters, args, args.workers, args.threads_per_worker)
+        print(f'Trained {len(results)} quarters on {args.workers} workers in {(time.time() - start_t):.2f}s')
+        print(f'Used {sum(r["epochs_used"] for r in results)}/{args.epochs * len(results)} epochs, '
+              f'early stopping saved ~{sum(r["time_saved"] for r in results):.2f}s of worker time')
+        for result in results:
+            record_quarter(manifest, panel, result['graph'], hparams, result['min_val_loss'], result['loss_test'])
+    else:
+        # Create the model
+        # The model consists of a 2-layer stack of Graph Attention Layers (GATs).
+        gat_net = build_model(args, device)
     
-    # configure the optimizer and loss function
-    optimizer = Adam(gat_net.parameters(), lr=args.lr, weight_decay=args.l2)
-    criterion = nn.MSELoss()
+        # configure the loss function, the optimizer is reset for every quarter
+        criterion = nn.MSELoss()
     
-    for graph in range(1, len(dates)+1):
-        if graph <= len(dates):
-            F_date = dates[graph]
-            print(f"第{graph}筆的資料: {F_date}")
-        else:
-            F_date = ''
-            print(f"第{graph}筆的資料不存在。")
-
-        features, labels, adj_mat = read_data(file_paths,graph)
-        
-        # 創建並移動索引
-        idx = torch.randperm(len(labels)).to(device)
-        idx_train, idx_val, idx_test = idx[:60], idx[60:68], idx[68:]
-        
-        # 初始化損失列表
-        train_losses = []
-        val_losses = []
-        
-        min_loss_val = 0
+        results = []
+        for graph in quarters:
+            results.append(fit_quarter(gat_net, criterion, panel, graph, args, device))
+            record_quarter(manifest, panel, graph, hparams, results[-1]['min_val_loss'], results[-1]['loss_test'])
+            if not args.dry_run:
+                save_manifest(manifest)
+        print(f'Used {sum(r["epochs_used"] for r in results)}/{args.epochs * len(results)} epochs, '
+              f'early stopping saved ~{sum(r["time_saved"] for r in results):.2f}s')
 
-        # Train and evaluate the model
-        for epoch in range(args.epochs):
-            loss_train, loss_val = train_iter(epoch + 1, gat_net, optimizer, criterion, (features, adj_mat), labels, idx_train, idx_val, stock_codes, F_date , args.val_every)
-            train_losses.append(loss_train)
-            val_losses.append(loss_val)
-            if args.dry_run:
-                break
-        
-        
-        loss_test = test(gat_net, criterion, (features, adj_mat), labels, idx_test)
-        #print(gat_net)
-        print(f'Test set results: loss {loss_test:.4f}')
-        
-        # 獲得最小訓練損失及其對應的epoch
-        min_train_loss_epoch = train_losses.index(min(train_losses)) + 1  # 索引+1，因為epoch從1開始
-        min_train_loss = min(train_losses)
-        
-        # 獲得最小驗證損失及其對應的epoch
-        min_val_loss_epoch = val_losses.index(min(val_losses)) + 1  # 索引+1，因為epoch從1開始
-        min_val_loss = min(val_losses)
-        
-        print(f"Minimum training loss of {min_train_loss} occurred at epoch {min_train_loss_epoch}.")
-        print(f"Minimum validation loss of {min_val_loss} occurred at epoch {min_val_loss_epoch}.")
\ No newline at end of file
+    if quarters and not args.dry_run:
+        save_manifest(manifest)
@@ -4,6 +4,9 @@ import requests
 import tarfile
 import numpy as np
 import argparse
+import glob
+import hashlib
+import pandas as pd
 
 import torch
 
@@ -52,4 +55,140 @@ def load_cora(path='./cora', device='cpu'):
     adj_mat = torch.eye(V) + adj_mat # Add self-loops to the adjacency matrix
 
     # return features.to_sparse().to(device), labels.to(device), adj_mat.to_sparse().to(device)
-    return features.to(device), labels.to(device), adj_mat.to(device)
\ No newline at end of file
+    return features.to(device), labels.to(device), adj_mat.to(device)
+
+################################
+### LOADING THE STOCK PANEL  ###
+################################
+
+FEATURE_COLS = ["CostOfGoodsSold",
+                "EPS",
+                "IncomeAfterTaxes",
+                "IncomeFromContinuingOperations",
+                "OtherComprehensiveIncome",
+                "Revenue",
+                "TAX",
+                "TotalConsolidatedProfitForThePeriod",
+                "CapitalStock",
+                "CapitalSurplus",
+                "CashAndCashEquivalents",
+                "CurrentAssets",
+                "Equity",
+                "NoncurrentAssets",
+                "NoncurrentLiabilities",
+                "OrdinaryShare",
+                "OtherCurrentLiabilities",
+                "OtherEquityInterest",
+                "RetainedEarnings",
+                "TotalAssets",
+                "CashBalancesBeginningOfPeriod",
+                "CashBalancesEndOfPeriod",
+                "Depreciation",
+                "PayTheInterest",
+                "PropertyAndPlantAndEquipment" ]
+
+LABEL_COLS = ["sharpe_ratio"]
+
+PANEL_CACHE = 'panel_cache.npz'
+
+
+def _source_signature(file_paths):
+    """Returns the (names, mtimes) pair used to validate the panel cache."""
+    names = np.array([os.path.basename(f) for f in file_paths])
+    mtimes = np.array([os.stat(f).st_mtime_ns for f in file_paths], dtype=np.int64)
+    return names, mtimes
+
+
+def load_panel(data_dir='./data', feature_cols=FEATURE_COLS, label_cols=LABEL_COLS, cache_path=None):
+    """
+    Loads every `<stock>.csv` in `data_dir` once into dense (quarter, stock, feature) arrays.
+
+    The parsed panel is cached next to the sources as a `.npz` file, which is reused as long as
+    the set of CSV files and their modification times are unchanged.
+
+    Returns:
+        dict: `features` (n_quarters, n_stocks, n_features), `labels` (n_quarters, n_stocks),
+            `dates` (n_quarters,) and `stock_codes` (n_stocks,), stocks sorted by file name.
+    """
+    file_paths = sorted(glob.glob(os.path.join(data_dir, '*.csv')))
+    if not file_paths:
+        raise FileNotFoundError(f'No stock CSV files found in {data_dir}')
+    if cache_path is None:
+        cache_path = os.path.join(data_dir, PANEL_CACHE)
+
+    names, mtimes = _source_signature(file_paths)
+    columns = np.array(list(feature_cols) + list(label_cols))
+
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache:
+                if (np.array_equal(cache['names'], names) and np.array_equal(cache['mtimes'], mtimes)
+                        and np.array_equal(cache['columns'], columns)):
+                    return {key: cache[key] for key in ('features', 'labels', 'dates', 'stock_codes')}
+        except Exception as e:
+            print(f'Ignoring unreadable panel cache {cache_path} ({type(e).__name__}: {e}), rebuilding it')
+
+    dates = None
+    values = []
+    for f in file_paths:
+        df = pd.read_csv(f, usecols=['date'] + list(columns))
+        if dates is None:
+            # a unicode array, an object array would need pickling and could not be loaded back from the cache
+            dates = df['date'].to_numpy(dtype=str)
+        elif len(df) != len(dates):
+            raise ValueError(f'{f} has {len(df)} quarters, expected {len(dates)}')
+        values.append(df[list(columns)].values.astype(np.float64))
+
+    # (n_stocks, n_quarters, n_columns) -> (n_quarters, n_stocks, n_columns)
+    panel = np.ascontiguousarray(np.stack(values).transpose(1, 0, 2))
+    n_features = len(feature_cols)
+    data = {
+        'features': panel[:, :, :n_features],
+        'labels': panel[:, :, n_features:].squeeze(-1) if len(label_cols) == 1 else panel[:, :, n_features:],
+        'dates': dates,
+        'stock_codes': np.array([os.path.splitext(name)[0] for name in names]),
+    }
+
+    # write to a temporary file first so a concurrent reader never sees a partial cache
+    tmp_path = cache_path + '.tmp.npz'
+    np.savez(tmp_path, names=names, mtimes=mtimes, columns=columns, **data)
+    os.replace(tmp_path, cache_path)
+    return data
+
+
+def quarter_hash(panel, index):
+    """Content hash of one quarter's feature/label slice, together with the stock universe it covers."""
+    digest = hashlib.sha256()
+    digest.update('\n'.join(panel['stock_codes'].tolist()).encode('utf-8'))
+    digest.update(np.ascontiguousarray(panel['features'][index]).tobytes())
+    digest.update(np.ascontiguousarray(panel['labels'][index]).tobytes())
+    return digest.hexdigest()
+
+
+def knn_adjacency(features, k, chunk_size=1024):
+    """
+    Builds a sparse top-k neighbour adjacency matrix from node features.
+
+    Every node is connected to itself and to the `k` other nodes with the highest cosine similarity
+    of their feature vectors. Similarities are computed `chunk_size` rows at a time, so the dense
+    n_nodes x n_nodes matrix is never materialized.
+
+    Returns:
+        torch.Tensor: sparse COO adjacency matrix with shape (n_nodes, n_nodes) and n_nodes * (k + 1) edges.
+    """
+    n_nodes = features.shape[0]
+    k = min(k, n_nodes - 1)
+    normed = torch.nn.functional.normalize(torch.nan_to_num(features.float()), dim=1)
+
+    rows, cols = [], []
+    for start in range(0, n_nodes, chunk_size):
+        similarity = normed[start:start + chunk_size] @ normed.T
+        chunk_rows = torch.arange(start, start + similarity.shape[0], device=features.device)
+        similarity[torch.arange(similarity.shape[0]), chunk_rows] = float('inf') # always keep the self-loop
+        neighbours = similarity.topk(k + 1, dim=1).indices
+        rows.append(chunk_rows.repeat_interleave(k + 1))
+        cols.append(neighbours.reshape(-1))
+
+    indices = torch.stack([torch.cat(rows), torch.cat(cols)])
+    values = torch.ones(indices.shape[1], device=features.device)
+    return torch.sparse_coo_tensor(indices, values, (n_nodes, n_nodes), check_invariants=False).coalesce()
@@ -0,0 +1,100 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from finrl.config import INDICATORS, CHIPS
+from finrl.agents.stablebaselines3.models import DRLAgent
+from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+from finrl.meta.env_stock_trading.env_stocktrading_array import StockTradingArrayEnv
+
+#################################
+###  PARALLEL ENV ROLLOUTS    ###
+#################################
+
+ENV_CLASSES = {'dataframe': StockTradingEnv, 'array': StockTradingArrayEnv}
+
+def synthetic_train_data(n_stocks, n_days, seed):
+    """Random-walk prices and indicators with the layout of `data_split` output (one row per stock per day)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2013-01-01', periods=n_days).strftime('%Y-%m-%d')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_stocks)), axis=0))
+    df = pd.DataFrame({
+        'date': np.repeat(dates, n_stocks),
+        'tic': np.tile(np.arange(1000, 1000 + n_stocks), n_days),
+        'close': close.round(2).ravel(),
+    })
+    for column in INDICATORS + CHIPS:
+        df[column] = rng.normal(0, 1, len(df))
+    df.index = df.date.factorize()[0]
+    return df
+
+def env_kwargs(n_stocks):
+    # same settings as the training notebook, without capital reductions and dividends
+    return {
+        "hmax": 1000,
+        "initial_amount": 1000000,
+        "num_stock_shares": [0] * n_stocks,
+        "buy_cost_pct": [0.001425] * n_stocks,
+        "sell_cost_pct": [0.004425] * n_stocks,
+        "state_space": 1 + 2 * n_stocks + len(INDICATORS + CHIPS) * n_stocks,
+        "stock_dim": n_stocks,
+        "tech_indicator_list": INDICATORS,
+        "action_space": n_stocks,
+        "reward_scaling": 1e-4,
+        "chips_list": CHIPS,
+        "cap_reduction": pd.DataFrame(columns=['tic', 'stock_id', 'date', 'new_stock', 'return', 'index']),
+        "cash_share": pd.DataFrame(columns=['date', 'tic', 'share', 'cash', 'index']),
+        "print_verbosity": 10**9,
+    }
+
+def steps_per_second(vec_env, n_steps, seed):
+    """Steps the vectorized env with random actions, returns environment steps (summed over the copies) per second."""
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(-1, 1, (n_steps, vec_env.num_envs) + vec_env.action_space.shape).astype(np.float32)
+    vec_env.reset()
+    start_t = time.perf_counter()
+    for step_actions in actions:
+        vec_env.step(step_actions)
+    return n_steps * vec_env.num_envs / (time.perf_counter() - start_t)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark rollout throughput of DRLAgent.get_parallel_env for several numbers of envs')
+    parser.add_argument('--envs', type=int, nargs='+', default=[1, 4, 8, 16],
+                        help='numbers of parallel envs (default: 1 4 8 16)')
+    parser.add_argument('--stocks', type=int, default=14,
+                        help='number of synthetic stocks (default: 14, as in the training notebook)')
+    parser.add_argument('--days', type=int, default=2500,
+                        help='number of synthetic trading days (default: 2500)')
+    parser.add_argument('--window', type=int, default=250,
+                        help='train window of every env in days, 0 for the whole data (default: 250)')
+    parser.add_argument('--steps', type=int, default=1000,
+                        help='timed vectorized steps per run (default: 1000)')
+    parser.add_argument('--env-class', type=str, default='array', choices=sorted(ENV_CLASSES),
+                        help='environment implementation (default: array)')
+    parser.add_argument('--vec-env', type=str, default='subproc', choices=['subproc', 'dummy', 'batch'],
+                        help='vectorized env wrapper, batch steps all envs as one array in this process (default: subproc)')
+    parser.add_argument('--seed', type=int, default=13, metavar='S',
+                        help='random seed (default: 13)')
+    args = parser.parse_args()
+
+    df = synthetic_train_data(args.stocks, args.days, args.seed)
+    print(f'{args.stocks} stocks x {args.days} days, {args.env_class} env, {args.vec_env}, {args.steps} steps per run')
+    print(f'{"envs":>5} {"steps/s":>10} {"speedup":>8}')
+    baseline = None
+    kwargs = env_kwargs(args.stocks)
+    if args.vec_env == 'batch':
+        del kwargs['print_verbosity'] # StockTradingBatchEnv prints no episode summaries
+    for n_envs in args.envs:
+        vec_env = DRLAgent.get_parallel_env(
+            df, kwargs, n_envs=n_envs, window=args.window or None,
+            env_class=ENV_CLASSES[args.env_class], vec_env=args.vec_env, seed=args.seed,
+        )
+        try:
+            rate = steps_per_second(vec_env, args.steps, args.seed)
+        finally:
+            vec_env.close()
+        baseline = baseline or rate
+        print(f'{n_envs:>5} {rate:>10.0f} {rate / baseline:>7.1f}x')
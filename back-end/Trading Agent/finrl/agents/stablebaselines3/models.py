@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import time
+from functools import partial
 
 import numpy as np
 import pandas as pd
@@ -11,9 +12,12 @@ from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common.noise import NormalActionNoise
 from stable_baselines3.common.noise import OrnsteinUhlenbeckActionNoise
 from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.vec_env import SubprocVecEnv
 
 from finrl import config
 from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+from finrl.meta.env_stock_trading.env_stocktrading_batch import StockTradingBatchEnv
+from finrl.meta.env_stock_trading.env_stocktrading_window import RandomWindowEnv
 from finrl.meta.preprocessor.preprocessors import data_split
 
 MODELS = { "ppo": PPO}
@@ -59,11 +63,76 @@ class DRLAgent:
             and output the trained model
         DRL_prediction()
             make a prediction in a test dataset and get results
+        get_parallel_env()
+            build several copies of the trading environment stepped in parallel
     """
 
     def __init__(self, env):
         self.env = env
 
+    @staticmethod
+    def get_parallel_env(
+        df,
+        env_kwargs,
+        n_envs=4,
+        window=None,
+        env_class=StockTradingEnv,
+        vec_env="subproc",
+        start_method=None,
+        seed=None,
+    ):
+        """Builds `n_envs` independent copies of the trading environment as one vectorized env
+
+        With `vec_env="subproc"` every copy runs in its own process (`SubprocVecEnv`), so the rollouts of
+        PPO are collected on `n_envs` cores instead of one; `"dummy"` steps them one after the other in
+        this process (`DummyVecEnv`), and `"batch"` keeps all of them as rows of one array stepped
+        together (`StockTradingBatchEnv`, hundreds of copies in one process; `env_class` is not used).
+        With `window`, every copy draws a new random train window for every episode; with `"subproc"` and
+        `"dummy"` the copy (`RandomWindowEnv`) builds `env_class` again on the days of the new window at each
+        reset. Note that `n_steps` of PPO is per copy: a rollout holds `n_steps * n_envs` samples.
+
+        Parameters
+        ----------
+            df: pandas dataframe
+                train data, indexed by day as returned by `data_split`
+            env_kwargs: dict
+                arguments of the environment, as for `StockTradingEnv(df=df, **env_kwargs)`
+            window: int
+                days of the train window of every episode, its first day is drawn at random (None: every
+                copy trades the whole `df`)
+            env_class: class
+                `StockTradingEnv` or a subclass such as `StockTradingArrayEnv`
+            start_method: str
+                start method of the processes ("spawn", "fork" or "forkserver", None: platform default)
+            seed: int
+                seed of the random train windows
+
+        Returns
+        -------
+            VecEnv, to be passed as `env` of `DRLAgent`
+        """
+        if vec_env == "batch":
+            return StockTradingBatchEnv(df, n_envs, window=window, seed=seed, **env_kwargs)
+
+        n_days = len(df.index.unique())
+        if window is not None and not 1 < window <= n_days:
+            raise ValueError(f"window must be between 2 and the {n_days} days of df")
+
+        if window is None:
+            env_fns = [partial(env_class, df=df, **env_kwargs) for _ in range(n_envs)]
+        else:
+            # every copy draws its windows from a random stream of its own
+            env_fns = [
+                partial(RandomWindowEnv, df=df, window=window, env_class=env_class, seed=copy_seed, **env_kwargs)
+                for copy_seed in np.random.SeedSequence(seed).spawn(n_envs)
+            ]
+
+        if vec_env == "subproc":
+            return SubprocVecEnv(env_fns, start_method=start_method)
+        if vec_env == "dummy":
+            return DummyVecEnv(env_fns)
+        raise ValueError(f"unknown vec_env: {vec_env}")
+
     def get_model(
         self,
         model_name,
@@ -226,6 +226,74 @@ class StockTradingEnv(gym.Env):
         plt.savefig(f"results/account_value_trade_{self.episode}.png")
         plt.close()
 
+    def _apply_corporate_actions(self):
+        """Applies the capital reductions (`cap_reduction`) and ex-rights / ex-dividends (`cash_share`) of the current day."""
+        #加入減資訊息
+        df_csp = self.cap_reduction[self.cap_reduction['date']==self._get_date()]
+
+        if (len(df_csp) > 0):
+            
+            for csp in range(len(df_csp)):  
+                stock_id = df_csp.iat[csp,0]
+                stock_name = df_csp.iat[csp,1]
+                csp_date = df_csp.iat[csp,2]
+                new_stock = df_csp.iat[csp,3]
+                reture_cash = df_csp.iat[csp,4]
+                csp_index = df_csp.iat[csp,5]
+                #針對Action來做運算(根據減資條件)
+                self.state[0] = self.state[0] + self.state[self.stock_dim + csp_index] * reture_cash # 加入退回的現金 = 股數 * 退回金額
+                self.state[(self.stock_dim + csp_index)] = self.state[(self.stock_dim + csp_index)]/1000*new_stock # 計算減資後的股票
+
+                #針對action memory進行調整
+                for action_array in range(len(self.actions_memory)):    
+
+                    self.actions_memory[action_array][csp_index-1] = self.actions_memory[action_array][csp_index-1]/1000*new_stock
+                    self.total_actions_memory = self.num_stock_shares
+                
+                for action_array in range(len(self.actions_memory)):
+                    self.total_actions_memory = np.sum([self.total_actions_memory,self.actions_memory[action_array]], axis=0) 
+                    self.total_actions_memory = list(self.total_actions_memory)
+        
+        #加入除權息
+        df_Ex_interest = self.cash_share[(self.cash_share['date']==self._get_date())] #& (self.cash_share['exp']==2.718281828)
+        
+        if (len(df_Ex_interest) > 0):
+            
+            for csp in range(len(df_Ex_interest)):  
+    
+                csp_date = df_Ex_interest.iat[csp,0]
+                stock_id = df_Ex_interest.iat[csp,1]
+                reture_cash = df_Ex_interest.iat[csp,2]
+                return_stock = df_Ex_interest.iat[csp,3]   
+                csp_index = int(df_Ex_interest.iat[csp,4])
+            
+                #針對Action來做運算(加上發放的股票跟現金)
+                if (reture_cash> 0):
+                    # 加入退回的現金 = 股數 * 退回金額
+                    self.state[0] = self.state[0] + self.state[self.stock_dim + csp_index] * reture_cash
+                if(return_stock > 0):
+                    # 加入除權的股票
+                    self.state[(self.stock_dim + csp_index)] += self.state[(self.stock_dim + csp_index)]*return_stock/1000
+
+    def _execute_actions(self, actions):
+        """Executes the sells (strongest first) and then the buys (strongest first), returns the filled share counts."""
+        argsort_actions = np.argsort(actions)
+
+        sell_index = argsort_actions[: np.where(actions < 0)[0].shape[0]]
+
+        buy_index = argsort_actions[::-1][: np.where(actions > 0)[0].shape[0]]
+
+        
+        for index in sell_index:
+
+            actions[index] = self._sell_stock(index, actions[index]) * (-1)
+
+        for index in buy_index:
+
+            actions[index] = self._buy_stock(index, actions[index])
+
+        return actions
+
     def step(self, actions):
 
         self.terminal = self.day >= len(self.df.index.unique()) - 1
@@ -304,52 +372,7 @@ class StockTradingEnv(gym.Env):
             return self.state, self.reward, self.terminal, {}
 
         else:
-            #加入減資訊息
-            df_csp = self.cap_reduction[self.cap_reduction['date']==self._get_date()]
-
-            if (len(df_csp) > 0):
-                
-                for csp in range(len(df_csp)):  
-                    stock_id = df_csp.iat[csp,0]
-                    stock_name = df_csp.iat[csp,1]
-                    csp_date = df_csp.iat[csp,2]
-                    new_stock = df_csp.iat[csp,3]
-                    reture_cash = df_csp.iat[csp,4]
-                    csp_index = df_csp.iat[csp,5]
-                    #針對Action來做運算(根據減資條件)
-                    self.state[0] = self.state[0] + self.state[self.stock_dim + csp_index] * reture_cash # 加入退回的現金 = 股數 * 退回金額
-                    self.state[(self.stock_dim + csp_index)] = self.state[(self.stock_dim + csp_index)]/1000*new_stock # 計算減資後的股票
-
-                    #針對action memory進行調整
-                    for action_array in range(len(self.actions_memory)):    
-
-                        self.actions_memory[action_array][csp_index-1] = self.actions_memory[action_array][csp_index-1]/1000*new_stock
-                        self.total_actions_memory = self.num_stock_shares
-                    
-                    for action_array in range(len(self.actions_memory)):
-                        self.total_actions_memory = np.sum([self.total_actions_memory,self.actions_memory[action_array]], axis=0) 
-                        self.total_actions_memory = list(self.total_actions_memory)
-            
-            #加入除權息
-            df_Ex_interest = self.cash_share[(self.cash_share['date']==self._get_date())] #& (self.cash_share['exp']==2.718281828)
-            
-            if (len(df_Ex_interest) > 0):
-                
-                for csp in range(len(df_Ex_interest)):  
-        
-                    csp_date = df_Ex_interest.iat[csp,0]
-                    stock_id = df_Ex_interest.iat[csp,1]
-                    reture_cash = df_Ex_interest.iat[csp,2]
-                    return_stock = df_Ex_interest.iat[csp,3]   
-                    csp_index = int(df_Ex_interest.iat[csp,4])
-                
-                    #針對Action來做運算(加上發放的股票跟現金)
-                    if (reture_cash> 0):
-                        # 加入退回的現金 = 股數 * 退回金額
-                        self.state[0] = self.state[0] + self.state[self.stock_dim + csp_index] * reture_cash
-                    if(return_stock > 0):
-                        # 加入除權的股票
-                        self.state[(self.stock_dim + csp_index)] += self.state[(self.stock_dim + csp_index)]*return_stock/1000 
+            self._apply_corporate_actions()
 
             actions = actions * self.hmax  # actions initially is scaled between 0 to 1
             actions = actions.astype(int)  # convert into integer because we can't by fraction of shares
@@ -363,20 +386,7 @@ class StockTradingEnv(gym.Env):
                 * np.array(self.state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)])
             )
 
-            argsort_actions = np.argsort(actions)
-
-            sell_index = argsort_actions[: np.where(actions < 0)[0].shape[0]]
-
-            buy_index = argsort_actions[::-1][: np.where(actions > 0)[0].shape[0]]
-
-            
-            for index in sell_index:
-
-                actions[index] = self._sell_stock(index, actions[index]) * (-1)
-
-            for index in buy_index:
-
-                actions[index] = self._buy_stock(index, actions[index])
+            actions = self._execute_actions(actions)
 
             self.actions_memory.append(actions)
             #把action list的數字相加
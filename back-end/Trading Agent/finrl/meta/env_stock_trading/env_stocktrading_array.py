@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+
+
+class MarketArrays:
+    """
+    The data frame of a trading environment as NumPy arrays, built once and only read afterwards.
+
+    Holds per day the close prices (days, stocks), the technical indicator / chips blocks (days, features * stocks)
+    laid out as in the state vector, the date and the turbulence, and the capital reductions / ex-dividends as a
+    day -> event arrays index. Shared by `StockTradingArrayEnv` and `StockTradingBatchEnv`.
+    """
+
+    def _build_arrays(self, df, kwargs, dtype):
+        stock_dim = kwargs["stock_dim"]
+        features = list(kwargs["tech_indicator_list"]) + list(kwargs["chips_list"])
+        days = np.asarray(df.index)
+        n_days = len(np.unique(days))
+        if len(df) != n_days * stock_dim or not np.array_equal(np.bincount(days, minlength=n_days), np.full(n_days, stock_dim)):
+            raise ValueError(f"every day must have one row for each of the {stock_dim} stocks")
+
+        # rows grouped by day in their original order, as df.loc[day, :] returns them
+        df = df.iloc[np.argsort(days, kind="stable")]
+        self._n_days = n_days
+        self._multi_stock = df.tic.nunique() > 1
+        self._tics = df.tic.values[:stock_dim]
+        self._dates = df.date.values[::stock_dim]
+        self._close = np.ascontiguousarray(df.close.to_numpy(dtype=dtype).reshape(n_days, stock_dim))
+        # (days, features, stocks) -> (days, features * stocks), feature-major as in the state vector
+        self._features = np.ascontiguousarray(
+            df[features].to_numpy(dtype=dtype).reshape(n_days, stock_dim, len(features)).transpose(0, 2, 1)
+        ).reshape(n_days, len(features) * stock_dim)
+        risk_indicator_col = kwargs.get("risk_indicator_col", "turbulence")
+        self._turbulence = (
+            df[risk_indicator_col].to_numpy()[::stock_dim] if risk_indicator_col in df.columns else None
+        )
+        self._dtype = dtype
+
+    def _build_event_index(self):
+        # day -> (stock index (1-based), new shares per 1000, returned cash) of the capital reductions and
+        # day -> (stock index (1-based), cash column, stock column) of the ex-rights / ex-dividends,
+        # with the column positions StockTradingEnv reads them from and in the order of the source rows
+        day_of = {date: day for day, date in enumerate(self._dates.tolist())}
+
+        def compile_events(events, date_col, index_col, value_cols):
+            index = {}
+            rows = zip(events[date_col].tolist(), events.iloc[:, index_col].tolist(),
+                       *(events.iloc[:, col].tolist() for col in value_cols))
+            for date, stock, *values in rows:
+                day = day_of.get(date)
+                if day is not None:
+                    index.setdefault(day, []).append((int(stock), *values))
+            return {
+                day: (np.array([e[0] for e in day_events], dtype=np.int64),)
+                + tuple(np.array([e[i] for e in day_events], dtype=np.float64) for i in range(1, len(value_cols) + 1))
+                for day, day_events in index.items()
+            }
+
+        self._cap_events = compile_events(self.cap_reduction, "date", 5, (3, 4))
+        self._cash_share_events = compile_events(self.cash_share, "date", 4, (2, 3))
+
+
+class StockTradingArrayEnv(MarketArrays, StockTradingEnv):
+    """
+    Array-backed variant of `StockTradingEnv` with the same constructor, trajectories and outputs.
+
+    The data frame is converted once at construction into contiguous (days, stocks) close prices,
+    (days, features * stocks) technical indicator / chips blocks laid out as in the state vector, and per-day
+    dates and turbulence. The state is a preallocated NumPy vector updated in place, so a step no longer looks
+    the day up in the data frame or rebuilds the state from `.values.tolist()`.
+
+    The capital reductions and ex-rights / ex-dividends are compiled into a day -> event arrays index, and the
+    actions of the episode are kept in a (days, stocks) buffer (`actions_memory` holds views of its rows), so a
+    capital reduction rescales the past actions of its stocks with one array operation.
+
+    The orders are executed in batch: the sells of all stocks in one array pass, the buys (strongest first, as in
+    `StockTradingEnv`) in one pass as long as the cash covers them and one by one from the first buy it limits.
+
+    Every day must hold one row per stock, in the same stock order (as produced by `data_split`).
+    `dtype=np.float32` halves the memory of the arrays, but only the default float64 reproduces the
+    trajectories of `StockTradingEnv` exactly.
+    """
+
+    def __init__(self, df: pd.DataFrame, *args, dtype=np.float64, **kwargs):
+        self._build_arrays(df, kwargs, dtype)
+        super().__init__(df, *args, **kwargs)
+        self._build_event_index()
+        self._buy_cost_pct = np.asarray(self.buy_cost_pct, dtype=np.float64)
+        self._sell_cost_pct = np.asarray(self.sell_cost_pct, dtype=np.float64)
+        self._actions_buffer = np.empty((self._n_days, self.stock_dim), dtype=np.int_)
+
+    def _apply_corporate_actions(self):
+        cap_events = self._cap_events.get(self.day)
+        if cap_events is not None:
+            stocks, new_stock, reture_cash = cap_events
+            if len(np.unique(stocks)) == len(stocks):
+                holdings = self.state[self.stock_dim + stocks]
+                # 加入退回的現金 = 股數 * 退回金額, added in the order of the events
+                self.state[0] = _sequential_sum(self.state[0], holdings * reture_cash)
+                # 計算減資後的股票
+                self.state[self.stock_dim + stocks] = holdings / 1000 * new_stock
+                self._rescale_past_actions(stocks - 1, new_stock)
+            else:
+                # several reductions of the same stock on one day depend on each other, apply them one by one
+                for stock, new, cash in zip(stocks, new_stock, reture_cash):
+                    self.state[0] = self.state[0] + self.state[self.stock_dim + stock] * cash
+                    self.state[self.stock_dim + stock] = self.state[self.stock_dim + stock] / 1000 * new
+                    self._rescale_past_actions(stock - 1, new)
+
+        cash_share_events = self._cash_share_events.get(self.day)
+        if cash_share_events is not None:
+            stocks, reture_cash, return_stock = cash_share_events
+            if len(np.unique(stocks)) == len(stocks):
+                holdings = self.state[self.stock_dim + stocks]
+                # 加入退回的現金 = 股數 * 退回金額
+                paid = reture_cash > 0
+                self.state[0] = _sequential_sum(self.state[0], holdings[paid] * reture_cash[paid])
+                # 加入除權的股票
+                issued = return_stock > 0
+                self.state[self.stock_dim + stocks[issued]] = (
+                    holdings[issued] + holdings[issued] * return_stock[issued] / 1000
+                )
+            else:
+                for stock, cash, shares in zip(stocks, reture_cash, return_stock):
+                    if cash > 0:
+                        self.state[0] = self.state[0] + self.state[self.stock_dim + stock] * cash
+                    if shares > 0:
+                        self.state[self.stock_dim + stock] += self.state[self.stock_dim + stock] * shares / 1000
+
+    def _rescale_past_actions(self, columns, new_stock):
+        """Rescales the past actions of the reduced stocks and recomputes their cumulative holdings."""
+        n_steps = len(self.actions_memory)
+        if n_steps == 0:
+            return
+        past = self._actions_buffer[:n_steps]
+        # assigning to the integer buffer truncates like the per-element assignment of StockTradingEnv
+        past[:, columns] = past[:, columns] / 1000 * new_stock
+        total_actions = np.array(self.total_actions_memory)
+        total_actions[columns] = np.asarray(self.num_stock_shares)[columns] + past[:, columns].sum(axis=0)
+        self.total_actions_memory = list(total_actions)
+
+    def _execute_actions(self, actions):
+        """Same fills, cash, cost and trades as the per-stock `_sell_stock` / `_buy_stock` calls of StockTradingEnv."""
+        s = self.stock_dim
+        argsort_actions = np.argsort(actions)
+        sell_index = argsort_actions[: np.count_nonzero(actions < 0)]
+        buy_index = argsort_actions[::-1][: np.count_nonzero(actions > 0)]
+
+        close = self.state[1 : s + 1]
+        holdings = self.state[s + 1 : 2 * s + 1]  # views, updated in place
+        # check if the stock is able to trade, for simlicity we just add it in techical index
+        disabled = self.state[2 * s + 1 : 3 * s + 1] == True
+        turbulent = self.turbulence_threshold is not None and self.turbulence >= self.turbulence_threshold
+
+        if len(sell_index) > 0:
+            price = close[sell_index]
+            held = holdings[sell_index]
+            if turbulent:
+                # if turbulence goes over threshold, just clear out all positions (of the stocks with a price)
+                sold = (price > 0) & (held > 0)
+                sell_num_shares = np.where(sold, held, 0)
+            else:
+                sold = ~disabled[sell_index] & (held > 0)
+                sell_num_shares = np.where(sold, np.minimum(np.abs(actions[sell_index]), held), 0)
+            sell_value = price[sold] * sell_num_shares[sold]
+            cost_pct = self._sell_cost_pct[sell_index[sold]]
+            # the proceeds and costs are added in the order of the sells, as the per-stock loop did
+            self.state[0] = _sequential_sum(self.state[0], sell_value * (1 - cost_pct))
+            holdings[sell_index[sold]] = held[sold] - sell_num_shares[sold]
+            self.cost = _sequential_sum(self.cost, sell_value * cost_pct)
+            self.trades += int(np.count_nonzero(sold))
+            actions[sell_index] = sell_num_shares * (-1)
+
+        if len(buy_index) > 0:
+            wanted = actions[buy_index]
+            actions[buy_index] = 0
+            if not turbulent:
+                enabled = ~disabled[buy_index]
+                actions[buy_index[enabled]] = self._buy_stocks(buy_index[enabled], wanted[enabled])
+
+        return actions
+
+    def _buy_stocks(self, buy_index, wanted):
+        """Buys the stocks in the given order, each limited by the cash left by the previous buys."""
+        s = self.stock_dim
+        price = self.state[1 : s + 1][buy_index]
+        cost_pct = self._buy_cost_pct[buy_index]
+        # when buying stocks, we should consider the cost of trading when calculating available_amount, or we may be have cash<0
+        unit_price = price * (1 + cost_pct)
+        buy_num_shares = np.zeros(len(buy_index))
+
+        # the cash before every buy if all of them were filled completely, fills are complete up to the first buy it limits
+        buy_value = price * wanted
+        cash = np.cumsum(np.concatenate(([self.state[0]], -(buy_value * (1 + cost_pct)))))
+        limited = np.flatnonzero(~(cash[:-1] // unit_price >= wanted))
+        n_full = limited[0] if len(limited) > 0 else len(buy_index)
+
+        buy_num_shares[:n_full] = wanted[:n_full]
+        self.state[0] = cash[n_full]
+        self.state[s + 1 + buy_index[:n_full]] += wanted[:n_full]
+        self.cost = _sequential_sum(self.cost, buy_value[:n_full] * cost_pct[:n_full])
+
+        # from there on the cash decides every fill, one buy after the other
+        for i in range(n_full, len(buy_index)):
+            available_amount = self.state[0] // unit_price[i]
+            buy_num_shares[i] = min(available_amount, wanted[i])
+            self.state[0] -= price[i] * buy_num_shares[i] * (1 + cost_pct[i])
+            self.state[s + 1 + buy_index[i]] += buy_num_shares[i]
+            self.cost += price[i] * buy_num_shares[i] * cost_pct[i]
+
+        # every buy counts as a trade, even when no share could be bought
+        self.trades += len(buy_index)
+        return buy_num_shares
+
+    def _initiate_state(self):
+        s = self.stock_dim
+        state = np.empty(1 + 2 * s + self._features.shape[1], dtype=self._dtype)
+        if self.initial:
+            state[0] = self.initial_amount
+            # the single stock case of StockTradingEnv starts without shares
+            state[s + 1 : 2 * s + 1] = self.num_stock_shares if self._multi_stock else 0
+        else:
+            state[0] = self.previous_state[0]
+            state[s + 1 : 2 * s + 1] = self.previous_state[(s + 1) : (s * 2 + 1)]
+        state[1 : s + 1] = self._close[self.day]
+        state[2 * s + 1 :] = self._features[self.day]
+        return state
+
+    def _update_state(self):
+        # cash and holdings stay in place, only the day's prices and features are copied in
+        self.state[1 : self.stock_dim + 1] = self._close[self.day]
+        self.state[2 * self.stock_dim + 1 :] = self._features[self.day]
+        return self.state
+
+    def _get_date(self):
+        return self._dates[self.day]
+
+    def _total_asset(self):
+        # cumsum adds left to right like the builtin sum() of StockTradingEnv, so the asset values are bit-identical
+        s = self.stock_dim
+        return self.state[0] + np.cumsum(self.state[1 : s + 1] * self.state[s + 1 : 2 * s + 1])[-1]
+
+    def step(self, actions):
+        if self.day >= self._n_days - 1:
+            # the end-of-episode report is the same as in StockTradingEnv
+            return super().step(actions)
+
+        self.terminal = False
+        self._apply_corporate_actions()
+
+        actions = actions * self.hmax  # actions initially is scaled between 0 to 1
+        actions = actions.astype(int)  # convert into integer because we can't by fraction of shares
+
+        if self.turbulence_threshold is not None:
+            if self.turbulence >= self.turbulence_threshold:
+                actions = np.array([-self.hmax] * self.stock_dim)
+
+        begin_total_asset = self._total_asset()
+
+        actions = self._execute_actions(actions)
+
+        self._actions_buffer[len(self.actions_memory)] = actions
+        self.actions_memory.append(self._actions_buffer[len(self.actions_memory)])
+        # 把action list的數字相加
+        self.total_actions_memory = np.sum([self.total_actions_memory, actions], axis=0)
+        self.total_actions_memory = list(self.total_actions_memory)
+
+        # state: s -> s+1
+        self.day += 1
+        if self.turbulence_threshold is not None:
+            self.turbulence = self._turbulence[self.day]
+        self.state = self._update_state()
+
+        end_total_asset = self._total_asset()  # 餘額 + 收盤價 * 股數(買入買出)
+
+        self.asset_memory.append(end_total_asset)
+        self.date_memory.append(self._get_date())
+        self.reward = end_total_asset - begin_total_asset
+        self.rewards_memory.append(self.reward)
+        self.reward = self.reward * self.reward_scaling
+        self.state_memory.append(
+            self.state.copy()
+        )  # the state vector is updated in place, keep a copy of every step
+
+        return self.state, self.reward, self.terminal, {}
+
+    def reset(self):
+        # like StockTradingEnv, the state is initiated from the day the previous episode ended on
+        self.state = self._initiate_state()
+
+        if self.initial:
+            self.asset_memory = [
+                self.initial_amount
+                + np.sum(
+                    np.array(self.num_stock_shares)
+                    * np.array(self.state[1 : 1 + self.stock_dim])
+                )
+            ]
+        else:
+            previous_total_asset = self.previous_state[0] + sum(
+                np.array(self.state[1 : (self.stock_dim + 1)])
+                * np.array(
+                    self.previous_state[(self.stock_dim + 1) : (self.stock_dim * 2 + 1)]
+                )
+            )
+            self.asset_memory = [previous_total_asset]
+
+        self.day = 0
+        self.turbulence = 0
+        self.cost = 0
+        self.trades = 0
+        self.terminal = False
+        self.rewards_memory = []
+        self.actions_memory = []
+        # a new buffer, the actions_memory of the previous episode may still be referenced
+        self._actions_buffer = np.empty((self._n_days, self.stock_dim), dtype=np.int_)
+        self.total_actions_memory = self.num_stock_shares
+        self.date_memory = [self._get_date()]
+
+        self.episode += 1
+
+        return self.state
+
+    def save_action_memory(self):
+        if self._multi_stock:
+            # date and close price length must match actions length
+            df_actions = pd.DataFrame(self.actions_memory)
+            df_actions.columns = self._tics
+            df_actions.index = pd.Index(self.date_memory[:-1], name="date")
+        else:
+            df_actions = pd.DataFrame(
+                {"date": self.date_memory[:-1], "actions": self.actions_memory}
+            )
+        return df_actions
+
+
+def _sequential_sum(start, values):
+    # start + values[0] + values[1] + ... added left to right (cumsum does not reorder), as the per-event loop did
+    if len(values) == 0:
+        return start
+    return np.cumsum(np.concatenate(([start], values)))[-1]
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from finrl.meta.env_stock_trading.env_stocktrading_array import MarketArrays
+
+
+class StockTradingBatchEnv(MarketArrays, VecEnv):
+    """
+    `n_envs` portfolios trading the same data in one process, stepped together with array operations.
+
+    The state of every portfolio is a row of a (n_envs, state_space) array with the layout of
+    `StockTradingEnv` (cash, close prices, holdings, technical indicators / chips), and all of them read the
+    same price and feature arrays (`MarketArrays`), so there is no Python object per portfolio. A step applies
+    the (n_envs, stock_dim) actions with the rules of `StockTradingEnv`: capital reductions and ex-dividends
+    of the day, turbulence liquidation, the trade-disable flag, sells before buys and buys limited by the cash,
+    strongest action first. With `window=None` every portfolio follows the trajectory `StockTradingEnv` would
+    produce for its actions (wrapped in a `DummyVecEnv`, including its terminal step and reset behaviour).
+
+    With `window`, every portfolio trades its own train window of `window` days, whose first day is drawn at
+    random (`seed`) each time the portfolio starts a new episode; the first observation of an episode holds the
+    prices and features of its first day.
+
+    The memories of `StockTradingEnv` (asset, actions, dates) are not kept; `cost` and `trades` hold the
+    totals of the current episode of every portfolio.
+    """
+
+    render_mode = None
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        n_envs: int,
+        cap_reduction: pd.DataFrame,
+        cash_share: pd.DataFrame,
+        stock_dim: int,
+        hmax: int,
+        initial_amount: int,
+        num_stock_shares: list[int],
+        buy_cost_pct: list[float],
+        sell_cost_pct: list[float],
+        reward_scaling: float,
+        state_space: int,
+        action_space: int,
+        tech_indicator_list: list[str],
+        chips_list: list[str],
+        turbulence_threshold=None,
+        risk_indicator_col="turbulence",
+        initial=True,
+        previous_state=[],
+        window=None,
+        seed=None,
+        dtype=np.float64,
+    ):
+        self._build_arrays(
+            df,
+            {
+                "stock_dim": stock_dim,
+                "tech_indicator_list": tech_indicator_list,
+                "chips_list": chips_list,
+                "risk_indicator_col": risk_indicator_col,
+            },
+            dtype,
+        )
+        if window is not None and not 1 < window <= self._n_days:
+            raise ValueError(f"window must be between 2 and the {self._n_days} days of df")
+        if turbulence_threshold is not None and self._turbulence is None:
+            raise ValueError(f"df has no {risk_indicator_col} column for the turbulence threshold")
+
+        self.cap_reduction = cap_reduction
+        self.cash_share = cash_share
+        self._build_event_index()
+        # days with a capital reduction or ex-dividend, looked up for all portfolios at once
+        self._event_days = np.zeros(self._n_days, dtype=bool)
+        self._event_days[list(self._cap_events) + list(self._cash_share_events)] = True
+
+        self.stock_dim = stock_dim
+        self.hmax = hmax
+        self.initial_amount = initial_amount
+        self.num_stock_shares = num_stock_shares
+        self.buy_cost_pct = buy_cost_pct
+        self.sell_cost_pct = sell_cost_pct
+        self._buy_cost_pct = np.asarray(buy_cost_pct, dtype=np.float64)
+        self._sell_cost_pct = np.asarray(sell_cost_pct, dtype=np.float64)
+        self.reward_scaling = reward_scaling
+        self.state_space = state_space
+        self.tech_indicator_list = tech_indicator_list
+        self.chips_list = chips_list
+        self.turbulence_threshold = turbulence_threshold
+        self.risk_indicator_col = risk_indicator_col
+        self.initial = initial
+        self.previous_state = previous_state
+        self.window = window
+        self._rng = np.random.default_rng(seed)
+
+        super().__init__(
+            n_envs,
+            spaces.Box(low=-np.inf, high=np.inf, shape=(state_space,)),
+            spaces.Box(low=-1, high=1, shape=(action_space,)),
+        )
+
+        self.state = np.empty((n_envs, 1 + 2 * stock_dim + self._features.shape[1]), dtype=dtype)
+        self.day = self._draw_start_days(n_envs)
+        self.start_day = self.day.copy()
+        self.turbulence = np.zeros(n_envs)
+        self.cost = np.zeros(n_envs)
+        self.trades = np.zeros(n_envs, dtype=np.int64)
+        self.reward = np.zeros(n_envs)
+        self._actions = None
+        self._initiate_state(np.arange(n_envs))
+
+    def _draw_start_days(self, n):
+        if self.window is None:
+            return np.zeros(n, dtype=np.int64)
+        return self._rng.integers(0, self._n_days - self.window + 1, size=n)
+
+    def _last_days(self):
+        if self.window is None:
+            return np.full(self.num_envs, self._n_days - 1)
+        return self.start_day + self.window - 1
+
+    def _initiate_state(self, envs):
+        s = self.stock_dim
+        state = self.state[envs]
+        if self.initial:
+            state[:, 0] = self.initial_amount
+            # the single stock case of StockTradingEnv starts without shares
+            state[:, s + 1 : 2 * s + 1] = self.num_stock_shares if self._multi_stock else 0
+        else:
+            state[:, 0] = self.previous_state[0]
+            state[:, s + 1 : 2 * s + 1] = self.previous_state[(s + 1) : (s * 2 + 1)]
+        state[:, 1 : s + 1] = self._close[self.day[envs]]
+        state[:, 2 * s + 1 :] = self._features[self.day[envs]]
+        self.state[envs] = state
+
+    def _reset_envs(self, envs, start_days):
+        if self.window is None:
+            # like StockTradingEnv.reset, the state is initiated from the day the previous episode ended on
+            self._initiate_state(envs)
+            self.day[envs] = start_days
+        else:
+            # the previous episode ended in an unrelated window, the new one starts from the prices of its first day
+            self.day[envs] = start_days
+            self._initiate_state(envs)
+        self.start_day[envs] = start_days
+        self.turbulence[envs] = 0
+        self.cost[envs] = 0
+        self.trades[envs] = 0
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            # VecEnv.seed() only seeds the train windows of the following episodes
+            self._rng = np.random.default_rng(self._seeds[0])
+        envs = np.arange(self.num_envs)
+        self._reset_envs(envs, self.start_day[envs])
+        self._reset_seeds()
+        self._reset_options()
+        return self.state.astype(np.float32)
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        terminal = self.day >= self._last_days()
+        if not terminal.all():
+            trading = np.flatnonzero(~terminal) if terminal.any() else slice(None)
+            self._step_envs(trading, np.asarray(self._actions)[trading])
+
+        # a terminal step only reports the end of the episode, with the reward of the last step
+        rewards = self.reward.astype(np.float32)
+        infos = [{"TimeLimit.truncated": False} for _ in range(self.num_envs)]
+        done = np.flatnonzero(terminal)
+        if len(done) > 0:
+            for env, observation in zip(done, self.state[done].astype(np.float32)):
+                infos[env]["terminal_observation"] = observation
+            self._reset_envs(done, self._draw_start_days(len(done)))
+        return self.state.astype(np.float32), rewards, terminal, infos
+
+    def _step_envs(self, envs, actions):
+        s = self.stock_dim
+        state = self.state[envs]
+        day = self.day[envs]
+        self._apply_corporate_actions(state, day)
+
+        actions = actions * self.hmax  # actions initially is scaled between 0 to 1
+        actions = actions.astype(int)  # convert into integer because we can't by fraction of shares
+        if self.turbulence_threshold is not None:
+            turbulent = self.turbulence[envs] >= self.turbulence_threshold
+            actions[turbulent] = -self.hmax
+        else:
+            turbulent = np.zeros(len(state), dtype=bool)
+
+        begin_total_asset = self._total_asset(state)
+        cost = self.cost[envs]
+        trades = self.trades[envs]
+        self._execute_actions(state, actions, turbulent, cost, trades)
+        self.cost[envs] = cost
+        self.trades[envs] = trades
+
+        # state: s -> s+1
+        day = day + 1
+        self.day[envs] = day
+        if self.turbulence_threshold is not None:
+            self.turbulence[envs] = self._turbulence[day]
+        state[:, 1 : s + 1] = self._close[day]
+        state[:, 2 * s + 1 :] = self._features[day]
+        self.state[envs] = state
+
+        end_total_asset = self._total_asset(state)  # 餘額 + 收盤價 * 股數(買入買出)
+        self.reward[envs] = (end_total_asset - begin_total_asset) * self.reward_scaling
+
+    def _apply_corporate_actions(self, state, day):
+        # the events are rare, the portfolios on an event day are grouped by day and the events of the day are
+        # applied one after the other (as StockTradingEnv does), each to all portfolios of the group at once
+        s = self.stock_dim
+        on_event_day = np.flatnonzero(self._event_days[day])
+        for event_day in np.unique(day[on_event_day]):
+            envs = on_event_day[day[on_event_day] == event_day]
+            cash = state[envs, 0]
+            holdings = state[envs, s + 1 : 2 * s + 1]
+            if event_day in self._cap_events:
+                for stock, new_stock, reture_cash in zip(*self._cap_events[event_day]):
+                    # 加入退回的現金 = 股數 * 退回金額
+                    cash = cash + holdings[:, stock - 1] * reture_cash
+                    # 計算減資後的股票
+                    holdings[:, stock - 1] = holdings[:, stock - 1] / 1000 * new_stock
+            if event_day in self._cash_share_events:
+                for stock, reture_cash, return_stock in zip(*self._cash_share_events[event_day]):
+                    if reture_cash > 0:
+                        cash = cash + holdings[:, stock - 1] * reture_cash
+                    if return_stock > 0:
+                        # 加入除權的股票
+                        holdings[:, stock - 1] += holdings[:, stock - 1] * return_stock / 1000
+            state[envs, 0] = cash
+            state[envs, s + 1 : 2 * s + 1] = holdings
+
+    def _execute_actions(self, state, actions, turbulent, cost, trades):
+        s = self.stock_dim
+        rows = np.arange(len(state))
+        close = state[:, 1 : s + 1]
+        holdings = state[:, s + 1 : 2 * s + 1]  # views, updated in place
+        # check if the stock is able to trade, for simlicity we just add it in techical index
+        disabled = state[:, 2 * s + 1 : 3 * s + 1] == True
+        argsort_actions = np.argsort(actions, axis=1)
+
+        # sells: the whole position if turbulence goes over threshold (stocks with a price), else up to the holdings
+        sold = (actions < 0) & (holdings > 0) & np.where(turbulent[:, None], close > 0, ~disabled)
+        sell_num_shares = np.where(
+            sold, np.where(turbulent[:, None], holdings, np.minimum(np.abs(actions), holdings)), 0
+        )
+        sell_value = close * sell_num_shares
+        # proceeds and costs are added in the order of the sells of every portfolio (zero for the other stocks)
+        state[:, 0] = _sequential_sum(state[:, 0], np.take_along_axis(sell_value * (1 - self._sell_cost_pct), argsort_actions, axis=1))
+        cost[:] = _sequential_sum(cost, np.take_along_axis(sell_value * self._sell_cost_pct, argsort_actions, axis=1))
+        holdings -= sell_num_shares
+        trades += sold.sum(axis=1)
+
+        # buys: strongest first, every buy limited by the cash left by the previous ones
+        buy_order = argsort_actions[:, ::-1]
+        for rank in range(int((actions > 0).sum(axis=1).max(initial=0))):
+            index = buy_order[:, rank]
+            buying = (actions[rows, index] > 0) & ~turbulent & ~disabled[rows, index]
+            envs, index = np.flatnonzero(buying), index[buying]
+            if len(envs) == 0:
+                continue
+            price = close[envs, index]
+            cost_pct = self._buy_cost_pct[index]
+            # when buying stocks, we should consider the cost of trading when calculating available_amount, or we may be have cash<0
+            available_amount = state[envs, 0] // (price * (1 + cost_pct))
+            buy_num_shares = np.minimum(available_amount, actions[envs, index])
+            state[envs, 0] -= price * buy_num_shares * (1 + cost_pct)
+            holdings[envs, index] += buy_num_shares
+            cost[envs] += price * buy_num_shares * cost_pct
+            trades[envs] += 1
+
+    def _total_asset(self, state):
+        # cumsum adds left to right like the builtin sum() of StockTradingEnv
+        s = self.stock_dim
+        return state[:, 0] + np.cumsum(state[:, 1 : s + 1] * state[:, s + 1 : 2 * s + 1], axis=1)[:, -1]
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        # the attributes are shared by all portfolios (per-portfolio values are arrays over the portfolios)
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # like get_attr, the method of the batch is called once for every requested portfolio
+        if not callable(getattr(self, method_name, None)):
+            raise AttributeError(
+                f"StockTradingBatchEnv has no method {method_name!r}: the asset / action memories of StockTradingEnv "
+                "are not kept, use StockTradingEnv for DRL_prediction"
+            )
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+
+def _sequential_sum(start, values):
+    # start + values[:, 0] + values[:, 1] + ... added left to right per row (cumsum does not reorder)
+    return np.cumsum(np.concatenate((start[:, None], values), axis=1), axis=1)[:, -1]
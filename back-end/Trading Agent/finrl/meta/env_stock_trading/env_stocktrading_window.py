@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import gym
+import numpy as np
+import pandas as pd
+
+from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+
+
+class RandomWindowEnv(gym.Env):
+    """
+    A trading environment that trades a new random train window of `window` days of `df` in every episode.
+
+    The first day of every window is drawn with `seed`, the days of the window are re-indexed from day 0 like
+    `data_split`, and `env_class` is built again on them when an episode starts (the first episode trades the
+    window drawn in `__init__`). `seed()` seeds the windows of the following episodes. The other attributes are
+    those of the environment of the current episode.
+    """
+
+    def __init__(self, df: pd.DataFrame, window: int, env_class=StockTradingEnv, seed=None, **env_kwargs):
+        self._df = df
+        self._n_days = len(df.index.unique())
+        if not 1 < window <= self._n_days:
+            raise ValueError(f"window must be between 2 and the {self._n_days} days of df")
+        self.window = window
+        self._env_class = env_class
+        self._env_kwargs = env_kwargs
+        self._rng = np.random.default_rng(seed)
+
+        self.env = self._build_env()
+        self.observation_space = self.env.observation_space
+        self.action_space = self.env.action_space
+        self._started = False
+
+    def _build_env(self):
+        # 隨機選取訓練區間, re-indexed from day 0 like data_split
+        self.start_day = int(self._rng.integers(0, self._n_days - self.window + 1))
+        env_df = self._df[(self._df.index >= self.start_day) & (self._df.index < self.start_day + self.window)]
+        env_df.index = env_df.index - self.start_day
+        return self._env_class(df=env_df, **self._env_kwargs)
+
+    def reset(self):
+        if self._started:
+            self.env = self._build_env()
+        self._started = True
+        return self.env.reset()
+
+    def step(self, actions):
+        return self.env.step(actions)
+
+    def render(self, mode="human", close=False):
+        return self.env.render(mode, close)
+
+    def seed(self, seed=None):
+        self._rng = np.random.default_rng(seed)
+        return [seed]
+
+    def __getattr__(self, name):
+        if name == "env":
+            raise AttributeError(name)
+        return getattr(self.env, name)
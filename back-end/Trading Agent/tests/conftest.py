@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# finrl is imported from the Trading Agent directory, as the notebook does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TECH = [f'coding{i}' for i in range(1, 9)]
+
+def make_market(n_days=120, n_stocks=14, seed=0, n_cap_reductions=6, n_dividends=10):
+    """
+    Random-walk prices with the layout of `data_split` output (one row per stock per day), a turbulence column,
+    and capital reductions / dividends on random days, in the format of csp_TCN.csv / twse_divide_ratio_TCN.csv.
+
+    Returns:
+        (df, env kwargs)
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=n_days).strftime('%Y-%m-%d')
+    tics = np.arange(1000, 1000 + n_stocks)
+    close = rng.uniform(20, 300, n_stocks) * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, n_stocks)), axis=0))
+    df = pd.DataFrame({
+        'date': np.repeat(dates, n_stocks),
+        'tic': np.tile(tics, n_days),
+        'close': close.round(2).ravel(),
+    })
+    for column in TECH:
+        df[column] = rng.normal(0, 1, len(df))
+    # coding1 == 1 disables trading the stock on that day
+    df['coding1'] = np.where(rng.random(len(df)) < 0.05, 1.0, df['coding1'])
+    df['turbulence'] = rng.uniform(0, 100, len(df))
+    df.index = df.date.factorize()[0]
+
+    days = rng.choice(n_days - 1, n_cap_reductions, replace=False)
+    cap_reduction = pd.DataFrame({'tic': rng.choice(tics, n_cap_reductions), 'stock_id': 'x', 'date': dates[days],
+                                  'new_stock': rng.uniform(300, 900, n_cap_reductions), 'return': rng.uniform(0, 5, n_cap_reductions)})
+    cap_reduction['index'] = cap_reduction.tic - tics[0] + 1
+    days = rng.choice(n_days - 1, n_dividends, replace=False)
+    cash_share = pd.DataFrame({'date': dates[days], 'tic': rng.choice(tics, n_dividends),
+                               'share': rng.choice([0.0, 1.5], n_dividends), 'cash': rng.choice([0.0, 30.0], n_dividends)})
+    cash_share['index'] = cash_share.tic - tics[0] + 1
+
+    kwargs = {
+        "hmax": 1000,
+        "initial_amount": 1000000,
+        "num_stock_shares": [0] * n_stocks,
+        "buy_cost_pct": [0.001425] * n_stocks,
+        "sell_cost_pct": [0.004425] * n_stocks,
+        "state_space": 1 + 2 * n_stocks + len(TECH) * n_stocks,
+        "stock_dim": n_stocks,
+        "tech_indicator_list": TECH,
+        "action_space": n_stocks,
+        "reward_scaling": 1e-4,
+        "chips_list": [],
+        "cap_reduction": cap_reduction,
+        "cash_share": cash_share,
+        "print_verbosity": 10**9,
+    }
+    return df, kwargs
+
+@pytest.fixture
+def market():
+    return make_market
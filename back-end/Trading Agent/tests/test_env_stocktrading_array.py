@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+from finrl.meta.env_stock_trading.env_stocktrading_array import StockTradingArrayEnv
+
+
+def rollout(env, actions, episodes=3):
+    """Steps `env` through several episodes, returns every observation, reward and the memories of each episode."""
+    records = []
+    step = 0
+    for _ in range(episodes):
+        records.append(np.array(env.reset(), dtype=float))
+        done = False
+        while not done:
+            state, reward, done, _ = env.step(actions[step % len(actions)].copy())
+            step += 1
+            records.append((np.array(state, dtype=float), reward, done))
+        records.append((
+            np.array(env.asset_memory, dtype=float), np.array(env.rewards_memory, dtype=float),
+            np.array(env.actions_memory, dtype=float), np.array(env.total_actions_memory, dtype=float),
+            list(env.date_memory), env.cost, env.trades,
+        ))
+    return records
+
+def assert_same_rollout(expected, actual):
+    assert len(expected) == len(actual)
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        a = a if isinstance(a, tuple) else (a,)
+        b = b if isinstance(b, tuple) else (b,)
+        for x, y in zip(a, b):
+            if isinstance(x, np.ndarray):
+                np.testing.assert_array_equal(x, y, err_msg=f'record {i}')
+            else:
+                assert x == y, f'record {i}'
+
+@pytest.mark.parametrize('seed, settings', [
+    (0, {}),
+    (1, {'turbulence_threshold': 70}),
+    (2, {'num_stock_shares': list(range(0, 1400, 100))}),
+])
+def test_matches_dataframe_env(market, seed, settings):
+    df, kwargs = market(seed=seed)
+    kwargs.update(settings)
+    actions = np.random.default_rng(seed).uniform(-1, 1, (150, kwargs['stock_dim']))
+    assert_same_rollout(rollout(StockTradingEnv(df=df, **kwargs), actions),
+                        rollout(StockTradingArrayEnv(df=df, **kwargs), actions))
+
+def test_matches_dataframe_env_from_previous_state(market):
+    df, kwargs = market(seed=3)
+    actions = np.random.default_rng(3).uniform(-1, 1, (150, kwargs['stock_dim']))
+    env = StockTradingEnv(df=df, **kwargs)
+    rollout(env, actions, episodes=1)
+    kwargs.update(initial=False, previous_state=list(env.state), turbulence_threshold=50)
+    assert_same_rollout(rollout(StockTradingEnv(df=df, **kwargs), actions),
+                        rollout(StockTradingArrayEnv(df=df, **kwargs), actions))
+
+def random_order_book(market, seed):
+    """Both envs on the same random cash, prices (with ties), holdings, disabled stocks, costs, turbulence and actions."""
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 121))
+    df, kwargs = market(n_days=3, n_stocks=n, seed=seed, n_cap_reductions=0, n_dividends=0)
+    kwargs.update(
+        hmax=int(rng.choice([100, 1000, 5000])),
+        buy_cost_pct=list(rng.choice([0, 0.001425, rng.uniform(0, 0.05)], n)),
+        sell_cost_pct=list(rng.choice([0, 0.004425, rng.uniform(0, 0.05)], n)),
+        turbulence_threshold=float(rng.uniform(0, 100)) if rng.random() < 0.5 else None,
+    )
+    # from no cash (every buy is limited) to enough cash for every buy
+    cash = float(rng.choice([0, 1e3, 1e5, 1e6, 1e7, 1e9]))
+    close = rng.choice(rng.uniform(1, 500, n).round(2), n)
+    holdings = rng.integers(0, 3000, n) * (rng.random(n) < 0.7)
+    disabled = rng.random(n) < 0.2
+    turbulence = float(rng.uniform(0, 100))
+    cost = float(rng.uniform(0, 100))
+    actions = (rng.uniform(-1, 1, n) * kwargs['hmax']).astype(int)
+    actions[rng.random(n) < 0.2] = actions[0] # ties
+    actions[rng.random(n) < 0.1] = 0
+
+    envs = []
+    for env_class in (StockTradingEnv, StockTradingArrayEnv):
+        env = env_class(df=df, **kwargs)
+        env.reset()
+        state = np.array(env.state, dtype=float)
+        state[0] = cash
+        state[1 : n + 1] = close
+        state[n + 1 : 2 * n + 1] = holdings
+        state[2 * n + 1 : 3 * n + 1] = np.where(disabled, 1.0, state[2 * n + 1 : 3 * n + 1])
+        env.state = state.tolist() if env_class is StockTradingEnv else state
+        env.turbulence = turbulence
+        env.cost = cost
+        env.trades = 7
+        envs.append(env)
+    return envs, actions
+
+@pytest.mark.parametrize('seed', range(60))
+def test_execute_actions_matches_per_stock_orders(market, seed):
+    (reference, env), actions = random_order_book(market, seed)
+    n = env.stock_dim
+    np.testing.assert_array_equal(env._execute_actions(actions.copy()), reference._execute_actions(actions.copy()))
+    np.testing.assert_array_equal(env.state[: 2 * n + 1], np.array(reference.state[: 2 * n + 1], dtype=float))
+    assert env.cost == reference.cost
+    assert env.trades == reference.trades
+
+def test_buys_after_the_first_limited_buy(market):
+    # 4 buys, strongest first: the cash fills the first one, limits the second, is short for the third
+    # and still fills the fourth (the cheapest) completely
+    df, kwargs = market(n_days=3, n_stocks=4, seed=0, n_cap_reductions=0, n_dividends=0)
+    actions = np.array([100, 80, 60, 2])
+    envs = []
+    for env_class in (StockTradingEnv, StockTradingArrayEnv):
+        env = env_class(df=df, **kwargs)
+        env.reset()
+        state = np.array(env.state, dtype=float)
+        state[0] = 100 * 10 * 1.001425 + 50 * 100 * 1.001425 + 60
+        state[1:5] = [10, 100, 200, 20]
+        state[5:9] = 0
+        state[9:13] = 0 # no stock disabled
+        env.state = state.tolist() if env_class is StockTradingEnv else state
+        envs.append(env)
+    reference, env = envs
+
+    filled = env._execute_actions(actions.copy())
+    np.testing.assert_array_equal(filled, [100, 50, 0, 2])
+    np.testing.assert_array_equal(filled, reference._execute_actions(actions.copy()))
+    np.testing.assert_array_equal(env.state[:9], np.array(reference.state[:9], dtype=float))
+    assert env.cost == reference.cost
+    assert env.trades == reference.trades == 4
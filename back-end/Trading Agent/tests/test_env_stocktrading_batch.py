@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from finrl.meta.env_stock_trading.env_stocktrading import StockTradingEnv
+from finrl.meta.env_stock_trading.env_stocktrading_batch import StockTradingBatchEnv
+
+
+def batch_kwargs(kwargs):
+    # StockTradingBatchEnv prints no episode summaries
+    return {key: value for key, value in kwargs.items() if key != 'print_verbosity'}
+
+@pytest.mark.parametrize('seed, n_stocks, n_envs, settings', [
+    (0, 14, 4, {}),
+    (1, 3, 3, {'turbulence_threshold': 60}),
+    (2, 1, 2, {}),
+    (3, 14, 3, {'initial_amount': 1e4, 'num_stock_shares': list(range(0, 1400, 100))}),
+])
+def test_matches_dummy_vec_env(market, seed, n_stocks, n_envs, settings):
+    df, kwargs = market(n_days=30, n_stocks=n_stocks, seed=seed, n_cap_reductions=4, n_dividends=6)
+    kwargs.update(settings)
+    rng = np.random.default_rng(seed)
+    reference = DummyVecEnv([lambda: StockTradingEnv(df=df, **kwargs) for _ in range(n_envs)])
+    env = StockTradingBatchEnv(df, n_envs, **batch_kwargs(kwargs))
+
+    np.testing.assert_array_equal(env.reset(), reference.reset())
+    # three episodes of every portfolio, terminal steps and automatic resets included
+    for _ in range(3 * 30):
+        actions = rng.uniform(-1, 1, (n_envs, n_stocks)).astype(np.float32)
+        expected, step = reference.step(actions), env.step(actions)
+        for x, y in zip(expected[:3], step[:3]):
+            np.testing.assert_array_equal(y, x)
+        for expected_info, info in zip(expected[3], step[3]):
+            if 'terminal_observation' in expected_info:
+                np.testing.assert_array_equal(info['terminal_observation'], np.float32(expected_info['terminal_observation']))
+        np.testing.assert_array_equal(env.state, [np.array(e.unwrapped.state, dtype=float) for e in reference.envs])
+        np.testing.assert_array_equal(env.cost, [e.unwrapped.cost for e in reference.envs])
+        np.testing.assert_array_equal(env.trades, [e.unwrapped.trades for e in reference.envs])
+
+def test_episode_starts_from_its_window(market):
+    df, kwargs = market(n_days=60, n_stocks=5, seed=4, n_cap_reductions=0, n_dividends=0)
+    kwargs.update(num_stock_shares=[100] * 5)
+    env = StockTradingBatchEnv(df, 8, window=10, seed=0, **batch_kwargs(kwargs))
+    env.reset()
+    hold = np.zeros((8, 5), dtype=np.float32)
+    restarted = 0
+    for _ in range(5 * 10):
+        observation, _, dones, _ = env.step(hold)
+        if not dones.any():
+            continue
+        # a new episode starts with the initial cash and shares at the prices of the first day of its window
+        start_day = env.start_day[dones]
+        assert (env.day[dones] == start_day).all()
+        np.testing.assert_array_equal(observation[dones, 0], np.float32(kwargs['initial_amount']))
+        np.testing.assert_array_equal(observation[dones, 1:6], env._close[start_day].astype(np.float32))
+        # and its first reward is the change of the value of the shares over the first day of the window
+        _, rewards, _, _ = env.step(hold)
+        expected = (env._close[start_day + 1] - env._close[start_day]).sum(axis=1) * 100 * kwargs['reward_scaling']
+        np.testing.assert_allclose(rewards[dones], expected, rtol=1e-5)
+        restarted += dones.sum()
+    assert restarted > 8
+
+def test_env_method(market):
+    df, kwargs = market(n_days=30, n_stocks=3, seed=5)
+    env = StockTradingBatchEnv(df, 4, window=10, seed=0, **batch_kwargs(kwargs))
+    env.reset()
+    last_days = env.env_method('_last_days', indices=[1, 3])
+    assert len(last_days) == 2
+    for days in last_days:
+        np.testing.assert_array_equal(days, env.start_day + 9)
+    assert len(env.env_method('_total_asset', env.state)) == 4
+    # DRL_prediction reads the memories through env_method, which the batch does not keep
+    for name in ['save_asset_memory', 'num_envs']:
+        with pytest.raises(AttributeError, match=f"StockTradingBatchEnv has no method '{name}'"):
+            env.env_method(name)
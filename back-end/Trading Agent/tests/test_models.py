@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from finrl.agents.stablebaselines3.models import DRLAgent
+from finrl.meta.env_stock_trading.env_stocktrading_array import StockTradingArrayEnv
+from finrl.meta.env_stock_trading.env_stocktrading_batch import StockTradingBatchEnv
+from test_env_stocktrading_batch import batch_kwargs
+
+
+def rollout(vec_env, n_steps, seed=0):
+    # random actions for n_steps, returns the observations, rewards, dones and the first day of every episode
+    rng = np.random.default_rng(seed)
+    observations, rewards, dones = [vec_env.reset()], [], []
+    start_days = [vec_env.get_attr('start_day')]
+    for _ in range(n_steps):
+        obs, reward, done, _ = vec_env.step(rng.uniform(-1, 1, (vec_env.num_envs,) + vec_env.action_space.shape))
+        observations.append(obs)
+        rewards.append(reward)
+        dones.append(done)
+        if done.any():
+            start_days.append(vec_env.get_attr('start_day'))
+    # DummyVecEnv keeps the observations in float32 buffers, SubprocVecEnv stacks them as they are
+    return np.float32(observations), np.float32(rewards), np.array(dones), np.array(start_days)
+
+def test_window_is_sliced_and_reindexed(market):
+    df, kwargs = market()
+    vec_env = DRLAgent.get_parallel_env(df, kwargs, n_envs=3, window=20, vec_env='dummy', seed=0)
+    observation = vec_env.reset()
+    for i, (start, env_df) in enumerate(zip(vec_env.get_attr('start_day'), vec_env.get_attr('df'))):
+        expected = df[(df.index >= start) & (df.index < start + 20)]
+        assert list(env_df.index.unique()) == list(range(20))
+        np.testing.assert_array_equal(env_df.to_numpy(), expected.to_numpy())
+        # the first observation holds the prices of the first day of the window
+        np.testing.assert_allclose(observation[i, 1:15], expected.loc[start, 'close'], rtol=1e-6)
+
+def test_window_is_redrawn_for_every_episode(market):
+    df, kwargs = market()
+    vec_env = DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=10, vec_env='dummy', seed=0)
+    _, _, dones, start_days = rollout(vec_env, 10 * 8)
+    # every episode trades the 10 days of its window, then the copy continues in a new one
+    assert dones.sum(axis=0).tolist() == [8, 8]
+    assert np.flatnonzero(dones[:, 0]).tolist() == list(range(9, 80, 10))
+    assert len(start_days) == 9
+    assert all(len(set(days)) > 1 for days in start_days.T)
+    assert start_days.min() >= 0 and start_days.max() <= 120 - 10
+    for start, env_df in zip(vec_env.get_attr('start_day'), vec_env.get_attr('df')):
+        np.testing.assert_array_equal(env_df.to_numpy(), df[(df.index >= start) & (df.index < start + 10)].to_numpy())
+
+def test_whole_df_without_window(market):
+    df, kwargs = market()
+    vec_env = DRLAgent.get_parallel_env(df, kwargs, n_envs=2, vec_env='dummy')
+    vec_env.reset()
+    assert all(env_df is df for env_df in vec_env.get_attr('df'))
+
+@pytest.mark.parametrize('vec_env', ['dummy', 'batch'])
+@pytest.mark.parametrize('window, valid', [(1, False), (2, True), (120, True), (121, False)])
+def test_window_bounds(market, vec_env, window, valid):
+    df, kwargs = market()
+    if vec_env == 'batch':
+        kwargs = batch_kwargs(kwargs)
+    if valid:
+        DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=window, vec_env=vec_env).reset()
+    else:
+        with pytest.raises(ValueError, match='window must be between 2 and the 120 days'):
+            DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=window, vec_env=vec_env)
+
+def test_vec_env_choices(market):
+    df, kwargs = market()
+    assert isinstance(DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=20, vec_env='dummy'), DummyVecEnv)
+    assert isinstance(DRLAgent.get_parallel_env(df, batch_kwargs(kwargs), n_envs=2, window=20, vec_env='batch'),
+                      StockTradingBatchEnv)
+    with pytest.raises(ValueError, match='unknown vec_env: threads'):
+        DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=20, vec_env='threads')
+
+def test_seed(market):
+    df, kwargs = market()
+    runs = [rollout(DRLAgent.get_parallel_env(df, kwargs, n_envs=3, window=10, vec_env='dummy', seed=seed), 40)
+            for seed in [0, 0, 1]]
+    for same in zip(runs[0], runs[1]):
+        np.testing.assert_array_equal(*same)
+    assert not np.array_equal(runs[0][3], runs[2][3])
+
+def test_subproc_with_spawn_matches_dummy(market):
+    df, kwargs = market()
+    expected = rollout(DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=10, env_class=StockTradingArrayEnv,
+                                                 vec_env='dummy', seed=0), 25)
+    # the copies are pickled to the spawned processes, which draw the same windows
+    vec_env = DRLAgent.get_parallel_env(df, kwargs, n_envs=2, window=10, env_class=StockTradingArrayEnv,
+                                        vec_env='subproc', start_method='spawn', seed=0)
+    try:
+        assert isinstance(vec_env, SubprocVecEnv)
+        for result, reference in zip(rollout(vec_env, 25), expected):
+            np.testing.assert_array_equal(result, reference)
+    finally:
+        vec_env.close()
@@ -1,75 +1,244 @@
-from flask import Flask, jsonify, send_file
+from flask import Flask, jsonify, send_file, Response, request
 from flask_cors import CORS
 import pandas as pd
-import glob
+import numpy as np
+import json
 import os
+import re
+import time
+import threading
+
+import attention_format
+from response_cache import ResponseCache
+from trading_store import get_store
+from file_watcher import ChangeFeed
 
 app = Flask(__name__)
 CORS(app)
 
+# 已序列化回應的快取，以來源檔案的 mtime 驗證，依 LRU 淘汰
+response_cache = ResponseCache(max_bytes=int(os.environ.get('API_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+
+def cached_response(key, paths, build, mimetype='application/json'):
+    """Serves the body built by `build()` from the response cache while the files in `paths` are unchanged.
+
+    JSON builders return the object to serialize, other builders return the body as str or bytes. The response carries
+    an ETag and Last-Modified, so a polling client that sends If-None-Match / If-Modified-Since gets an empty 304
+    while the data is unchanged, and large bodies are sent brotli- or gzip-compressed if the client accepts it.
+    """
+    cached = response_cache.get_or_build(key, paths, lambda: serialize_body(build(), mimetype))
+
+    encoding = request.accept_encodings.best_match(list(cached.encodings)) if cached.encodings else None
+    if encoding is not None:
+        response = Response(cached.encodings[encoding], mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f'{cached.etag}-{encoding}') # 壓縮後的內容是不同的表示，需要不同的強 ETag
+    else:
+        response = Response(cached.body, mimetype=mimetype)
+        response.set_etag(cached.etag)
+    if cached.encodings:
+        response.vary.add('Accept-Encoding')
+    response.last_modified = cached.last_modified
+    response.cache_control.no_cache = True # 瀏覽器每次輪詢都重新驗證
+    return response.make_conditional(request)
+
+def serialize_body(data, mimetype):
+    if isinstance(data, bytes):
+        return data
+    if mimetype == 'application/json':
+        return app.json.response(data).get_data() # same bytes as jsonify()
+    return data.encode('utf-8')
+
+# 資料檔案路徑，以 app.py 所在位置為準，不依賴啟動時的工作目錄
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GAT_OUTPUT_DIR = os.path.join(BASE_DIR, 'GAT_main', 'output')
+GAT_MANIFEST = os.path.join(GAT_OUTPUT_DIR, 'manifest.json')
+ATTENTION_FILE = re.compile(r'^tensor_epoch_(\d{4}-\d{2}-\d{2})\.csv$')
+TRADING_ACTIONS = os.path.join(BASE_DIR, 'Trading Agent', 'actions.csv')
+TRADING_ACCOUNT_VALUE = os.path.join(BASE_DIR, 'Trading Agent', 'account_value.csv')
+LOW_RISK_STOCKS = os.path.join(BASE_DIR, 'Trading Agent', 'Low-risk stock list.csv')
+SHARPE_RATIOS = os.path.join(BASE_DIR, 'Stock-Picked Agent', 'SharpeRatio.csv')
+QUARTERLY_PREDICTIONS = os.path.join(BASE_DIR, 'Stock-Picked Agent', 'quarterly_stock_predictions.csv')
+
+def gat_output_path(date):
+    return os.path.join(GAT_OUTPUT_DIR, f'tensor_epoch_{date}.csv')
+
 # 從GAT_main/output中獲取所有日期
+# ?meta=1 時每個日期附上節點數、檔案大小與訓練損失 (來自 GAT_main/output/manifest.json)
 @app.route('/api/dates', methods=['GET'])
 def get_available_dates():
+    meta = request.args.get('meta', '0') not in ('0', 'false', '')
+    # train.py 以 os.replace 寫入輸出與 manifest，目錄的 mtime 隨之改變，索引只在此時重建
+    return cached_response(('dates', meta), [GAT_OUTPUT_DIR], lambda: build_dates_index(meta))
+
+def build_dates_index(meta=False):
+    entries = []
+    with os.scandir(GAT_OUTPUT_DIR) as it:
+        for entry in it:
+            match = ATTENTION_FILE.match(entry.name)
+            if match:
+                entries.append((match.group(1), entry))
+    entries.sort(key=lambda e: e[0], reverse=True)
+    if not meta:
+        return [date for date, _ in entries]
+
+    try:
+        with open(GAT_MANIFEST, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
 
-    files = glob.glob('./GAT_main/output/*.csv')
-    dates = [os.path.basename(f).replace('tensor_epoch_', '').replace('.csv', '') for f in files]
-    dates.sort(reverse=True)  
-    return jsonify(dates)
+    index = []
+    for date, entry in entries:
+        with open(entry.path, 'r', encoding='utf-8') as f:
+            header = f.readline().rstrip('\r\n').split(',')
+        trained = manifest.get(date, {})
+        st = entry.stat()
+        index.append({
+            'date': date,
+            'nodes': sum(1 for c in header if c and not c.startswith('Unnamed: ')), # 略過 pandas 寫出的索引欄
+            'size_bytes': st.st_size,
+            'modified': st.st_mtime,
+            'min_val_loss': trained.get('min_val_loss'),
+            'loss_test': trained.get('loss_test'),
+        })
+    return index
 
 # 從GAT_main/output中獲取指定日期的CSV文件
+# ?format=f32 或 Accept: application/octet-stream 時回傳二進位 float32 矩陣 (格式見 attention_format.py)
 @app.route('/api/<date>', methods=['GET'])
 def gat(date):
     try:
 
-        file_path = f'./GAT_main/output/tensor_epoch_{date}.csv'
-        df = pd.read_csv(file_path)
-        
-        matrix_data = df.to_dict(orient='records')
-        return jsonify(matrix_data)
+        file_path = gat_output_path(date)
+        if attention_format_requested() == 'f32':
+            response = cached_response(('gat-f32', date), [file_path], lambda: build_attention_f32(file_path),
+                                       mimetype=attention_format.MIMETYPE)
+        else:
+            response = cached_response(('gat', date), [file_path], lambda: pd.read_csv(file_path).to_dict(orient='records'))
+        response.vary.add('Accept')
+        return response
     except FileNotFoundError:
         return jsonify({"error": "Data not found for the specified date"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# 多個日期的注意力矩陣，以串流一次回傳 (時間軸視圖使用)
+# ?dates=2024-05-16,2024-02-15 (預設全部日期) &format=f32|json
+@app.route('/api/attention', methods=['GET'])
+def gat_multi():
+    dates = request.args.get('dates')
+    dates = dates.split(',') if dates else build_dates_index()
+    file_paths = {date: gat_output_path(date) for date in dates}
+    missing = [date for date, file_path in file_paths.items() if not os.path.exists(file_path)]
+    if missing:
+        return jsonify({"error": f"Data not found for {', '.join(missing)}"}), 404
+
+    binary = attention_format_requested() == 'f32'
+
+    def generate():
+        for date, file_path in file_paths.items():
+            if binary:
+                body = response_cache.get_or_build(('gat-f32', date), [file_path], lambda: build_attention_f32(file_path))
+                yield attention_format.encode_frame(date, body.body)
+            else:
+                body = response_cache.get_or_build(('gat-ndjson', date), [file_path], lambda: build_attention_ndjson(date, file_path))
+                yield body.body
+
+    response = Response(generate(), mimetype=attention_format.MIMETYPE if binary else 'application/x-ndjson')
+    response.vary.add('Accept')
+    return response
+
+def attention_format_requested():
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'f32' if request.accept_mimetypes.best_match(['application/json', attention_format.MIMETYPE]) == attention_format.MIMETYPE else 'json'
+    return fmt
+
+def build_attention_f32(file_path):
+    return attention_format.encode_matrix(*attention_format.read_attention(file_path))
+
+def build_attention_ndjson(date, file_path):
+    # 每個日期一行 JSON: {"date": ..., "stocks": [...], "values": [[...], ...]}
+    matrix, stock_codes = attention_format.read_attention(file_path, dtype=np.float64)
+    return (json.dumps({"date": date, "stocks": stock_codes, "values": matrix.tolist()}, separators=(',', ':')) + '\n').encode('utf-8')
+
 # 從Trading Agent中獲取交易行為和帳戶價值數據
 @app.route('/api/trading-performance', methods=['GET'])
 def trading_performance():
 
-    actions_path = './Trading Agent/actions.csv'
-    account_value_path = './Trading Agent/account_value.csv'
+    actions_path = TRADING_ACTIONS
+    account_value_path = TRADING_ACCOUNT_VALUE
     
 
     if not os.path.exists(actions_path) or not os.path.exists(account_value_path):
         return jsonify({"error": "數據文件不存在"}), 404
-    
 
-    actions_df = pd.read_csv(actions_path)
-    account_value_df = pd.read_csv(account_value_path)
- 
-    actions_data = actions_df.to_dict(orient='records')
-    account_value_data = account_value_df.to_dict(orient='records')
-    
+    if not request.args:
+        return cached_response('trading-performance', [actions_path, account_value_path],
+                               lambda: build_trading_performance(actions_path, account_value_path))
 
-    account_value_df['daily_return'] = account_value_df['account_value'].pct_change()
-    account_value_df['daily_return'].iloc[0] = 0  
-    account_value_df['cumulative_return'] = (account_value_df['account_value'] / account_value_df['account_value'].iloc[0]) - 1
-    
- 
-    return jsonify({
-        "actions": actions_data,
-        "account_value": account_value_df[['date', 'account_value', 'daily_return', 'cumulative_return']].to_dict(orient='records'),
-        "stocks": actions_df.columns[1:].tolist()  
-    })
+    # 有查詢參數時從索引化的記憶體資料查詢，只回傳請求的範圍
+    # ?start=&end=(YYYY-MM-DD) &tickers=1229,2356 &every=N &points=M (LTTB) &limit=N &cursor=
+    try:
+        query = parse_trading_query(request.args)
+        # 快取鍵只由驗證並正規化後的參數組成，未知參數已被拒絕，不會產生額外的快取項目
+        key = ('trading-performance',) + tuple(tuple(value) if name == 'tickers' and value else value
+                                               for name, value in query.items())
+        return cached_response(key, [actions_path, account_value_path],
+                               lambda: get_store(actions_path, account_value_path).query(**query))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+TRADING_QUERY_PARAMS = ['start', 'end', 'tickers', 'every', 'points', 'limit', 'cursor']
+
+def parse_trading_query(args):
+    """Validates the query parameters of `/api/trading-performance` into the keyword arguments of `TradingStore.query`.
+
+    Every argument is present (omitted parameters get the defaults of `TradingStore.query`) and sizes are parsed to int,
+    so equivalent queries give the same arguments.
+
+    Raises:
+        ValueError: unknown or repeated parameter, a date that is not YYYY-MM-DD, or a size that is not an integer.
+    """
+    unknown = sorted(set(args) - set(TRADING_QUERY_PARAMS))
+    if unknown:
+        raise ValueError(f'unknown parameters: {", ".join(unknown)}')
+    repeated = [name for name in TRADING_QUERY_PARAMS if len(args.getlist(name)) > 1]
+    if repeated:
+        raise ValueError(f'parameters given more than once: {", ".join(repeated)}')
+
+    query = dict(start=None, end=None, tickers=None, every=1, points=None, limit=None, cursor=None)
+    for name in ['start', 'end', 'cursor']:
+        value = args.get(name)
+        if value is not None:
+            if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', value):
+                raise ValueError(f'{name} must be a date in the YYYY-MM-DD format')
+            query[name] = value
+    for name in ['every', 'points', 'limit']:
+        value = args.get(name)
+        if value is not None:
+            if not re.fullmatch(r'[0-9]+', value):
+                raise ValueError(f'{name} must be a positive integer')
+            query[name] = int(value)
+    tickers = args.get('tickers')
+    if tickers:
+        query['tickers'] = tickers.split(',')
+    return query
+
+def build_trading_performance(actions_path, account_value_path):
+    # 報酬率、回撤與滾動指標在 account_value.csv 變更時才計算一次 (trading_store.load_return_series)
+    data = get_store(actions_path, account_value_path).query()
+    del data['next_cursor']
+    return data
 
 # 從Trading Agent中獲取低風險股票列表
 @app.route('/api/low-risk-stocks', methods=['GET'])
 def get_low_risk_stocks():
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        csv_path = os.path.join(current_dir, 'Trading Agent', 'Low-risk stock list.csv')
+        csv_path = LOW_RISK_STOCKS
         
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return cached_response('low-risk-stocks', [csv_path], lambda: read_text(csv_path), mimetype='text/html')
     except Exception as e:
         print(f"Error reading CSV file: {str(e)}")
         return jsonify({"error": "Failed to read CSV file"}), 500
@@ -78,47 +247,188 @@ def get_low_risk_stocks():
 @app.route('/api/sharpe-ratios')
 def get_sharpe_ratios():
     try:
-        # Get the absolute path to the CSV file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(current_dir, 'Stock-Picked Agent', 'SharpeRatio.csv')
+        file_path = SHARPE_RATIOS
         
         if not os.path.exists(file_path):
             return jsonify({'error': f'File not found at {file_path}'}), 404
         
-        # Read the CSV file using pandas
-        df = pd.read_csv(file_path)
-        
-        # Convert the data to a format suitable for the frontend
-        # Group by stock_id to get time series of Sharpe ratios for each stock
-        sharpe_data = {}
-        for stock_id in df['stock_id'].unique():
-            stock_data = df[df['stock_id'] == stock_id]
-            sharpe_data[stock_id] = {
-                'dates': stock_data['date'].tolist(),
-                'values': stock_data['sharpe_ratio'].tolist()
-            }
-        
-        return jsonify(sharpe_data)
+        return cached_response('sharpe-ratios', [file_path], lambda: build_sharpe_ratios(file_path))
     except Exception as e:
         print(f"Error reading Sharpe ratio file: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def build_sharpe_ratios(file_path):
+    # Read the CSV file using pandas
+    df = pd.read_csv(file_path)
+    
+    # Convert the data to a format suitable for the frontend
+    # Group by stock_id to get time series of Sharpe ratios for each stock:
+    # one stable sort by stock then split at the stock boundaries, instead of filtering the frame once per stock
+    codes, stock_ids = pd.factorize(df['stock_id']) # stocks in order of first appearance, rows without a stock_id get -1
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    dates = np.split(df['date'].to_numpy()[order], bounds)
+    values = np.split(df['sharpe_ratio'].to_numpy()[order], bounds)
+
+    sharpe_data = {}
+    for stock_id, stock_dates, stock_values in zip(stock_ids, dates, values):
+        sharpe_data[stock_id] = {
+            'dates': stock_dates.tolist(),
+            'values': stock_values.tolist()
+        }
+    return sharpe_data
+
 # 從Stock-Picked Agent中獲取季度預測結果
 @app.route('/api/quarterly-predictions', methods=['GET'])
 def get_quarterly_predictions():
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        csv_path = os.path.join(current_dir, 'Stock-Picked Agent', 'quarterly_stock_predictions.csv')
+        csv_path = QUARTERLY_PREDICTIONS
         
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return cached_response('quarterly-predictions', [csv_path], lambda: read_text(csv_path), mimetype='text/html')
     except Exception as e:
         print(f"Error reading CSV file: {str(e)}")
         return jsonify({"error": "Failed to read CSV file"}), 500
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+# 儀表板首次載入所需的全部資料，一次請求回傳
+@app.route('/api/snapshot', methods=['GET'])
+def snapshot():
+    """
+    Bundles `/api/dates`, the latest `/api/<date>`, `/api/trading-performance`, `/api/low-risk-stocks`,
+    `/api/sharpe-ratios` and `/api/quarterly-predictions` in one JSON object.
+
+    Every part is taken from (or added to) the response cache under the key of its own endpoint, so the bundle splices
+    already-serialized bodies instead of parsing the CSV files again. The two CSV endpoints are embedded as strings,
+    a part whose source file is missing is null.
+    """
+    dates = json.loads(response_cache.get_or_build(('dates', False), [GAT_OUTPUT_DIR],
+                                                   lambda: serialize_body(build_dates_index(), 'application/json')).body)
+    latest = dates[0] if dates else None
+    parts = snapshot_parts(latest)
+    paths = [GAT_OUTPUT_DIR] + [path for _, _, part_paths, _, _ in parts for path in part_paths if os.path.exists(path)]
+    return cached_response(('snapshot', latest), paths, lambda: build_snapshot(latest, parts))
+
+def snapshot_parts(latest):
+    # (name, cache key, source files, builder, mimetype), the keys are those of the single endpoints
+    latest_path = gat_output_path(latest) if latest else None
+    return [
+        ('dates', ('dates', False), [GAT_OUTPUT_DIR], build_dates_index, 'application/json'),
+        ('attention', ('gat', latest), [latest_path] if latest else [],
+         lambda: pd.read_csv(latest_path).to_dict(orient='records'), 'application/json'),
+        ('trading_performance', 'trading-performance', [TRADING_ACTIONS, TRADING_ACCOUNT_VALUE],
+         lambda: build_trading_performance(TRADING_ACTIONS, TRADING_ACCOUNT_VALUE), 'application/json'),
+        ('low_risk_stocks', 'low-risk-stocks', [LOW_RISK_STOCKS], lambda: read_text(LOW_RISK_STOCKS), 'text/html'),
+        ('sharpe_ratios', 'sharpe-ratios', [SHARPE_RATIOS], lambda: build_sharpe_ratios(SHARPE_RATIOS), 'application/json'),
+        ('quarterly_predictions', 'quarterly-predictions', [QUARTERLY_PREDICTIONS],
+         lambda: read_text(QUARTERLY_PREDICTIONS), 'text/html'),
+    ]
 
+def build_snapshot(latest, parts):
+    chunks = [b'{"latest_date":', json.dumps(latest).encode('utf-8')]
+    for name, key, paths, build, mimetype in parts:
+        try:
+            if not paths:
+                raise FileNotFoundError(name)
+            body = response_cache.get_or_build(key, paths, lambda: serialize_body(build(), mimetype)).body
+            if mimetype != 'application/json':
+                body = json.dumps(body.decode('utf-8')).encode('utf-8')
+        except FileNotFoundError:
+            body = b'null'
+        chunks += [b',"', name.encode('utf-8'), b'":', body.rstrip()]
+    chunks.append(b'}\n')
+    return b''.join(chunks)
 
+# 檔案變更推送：新的 GAT 輸出或交易結果寫入時，以 SSE / long-poll 通知前端只重新抓取變更的資料
+WATCHED = [
+    ('gat', os.path.join(GAT_OUTPUT_DIR, 'tensor_epoch_*.csv')),
+    ('trading-performance', TRADING_ACTIONS),
+    ('trading-performance', TRADING_ACCOUNT_VALUE),
+    ('low-risk-stocks', LOW_RISK_STOCKS),
+    ('sharpe-ratios', SHARPE_RATIOS),
+    ('quarterly-predictions', QUARTERLY_PREDICTIONS),
+]
 
+def describe_change(resource, path):
+    # 變更事件附上需要重新抓取的 API
+    if resource == 'gat':
+        date = os.path.basename(path).replace('tensor_epoch_', '').replace('.csv', '')
+        return {'date': date, 'endpoints': ['/api/dates', f'/api/{date}']}
+    return {'endpoints': [f'/api/{resource}']}
 
+change_feed = ChangeFeed(WATCHED, interval=float(os.environ.get('API_WATCH_INTERVAL', 2.0)), describe=describe_change)
+
+# SSE 連線會一直佔用 gthread worker 的一個執行緒：每個 worker 同時開啟的串流數有上限（預設為執行緒數的一半），
+# 每條串流最多維持 API_SSE_MAX_SECONDS 秒後結束，瀏覽器的 EventSource 會帶著 Last-Event-ID 自動重新連線（可能連到另一個 worker）
+SSE_MAX_STREAMS = int(os.environ.get('API_SSE_MAX_STREAMS', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2)))
+SSE_MAX_SECONDS = float(os.environ.get('API_SSE_MAX_SECONDS', 120))
+SSE_BUSY_RETRY_MS = 10000
+sse_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """
+    Server-sent events: one `change` event per created, modified or deleted file, a comment every 15 s keeps the connection open.
+
+    A stream ends after `SSE_MAX_SECONDS`, and when the worker already serves `SSE_MAX_STREAMS` streams the response only
+    asks the client to retry later; either way EventSource reconnects with the id of the last event it received.
+    """
+    change_feed.start()
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+    since = int(since) if since is not None and since.isdigit() else change_feed.last_id
+
+    def generate(since):
+        # 在產生器內取得名額，連線在開始串流前就中斷時不會遺留佔用
+        if not sse_streams.acquire(blocking=False):
+            yield f'retry: {SSE_BUSY_RETRY_MS}\nid: {since}\n\n'
+            return
+        try:
+            yield f'retry: 5000\nid: {since}\n\n'
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                changes = change_feed.wait(since, timeout=min(15, max(deadline - time.monotonic(), 0)))
+                if not changes:
+                    yield ': keep-alive\n\n'
+                for event in changes:
+                    since = event['id']
+                    yield f"id: {since}\nevent: change\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        finally:
+            sse_streams.release()
+
+    response = Response(generate(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # nginx proxy 不緩衝事件
+    return response
+
+@app.route('/api/events/poll', methods=['GET'])
+def events_poll():
+    """Long-poll alternative to /api/events: waits up to `timeout` seconds (max 60) for events after `since`."""
+    change_feed.start()
+    since = request.args.get('since', None, type=int)
+    if since is None:
+        return jsonify({"last_id": change_feed.last_id, "events": []})
+    changes = change_feed.wait(since, timeout=min(request.args.get('timeout', 30, type=float), 60))
+    return jsonify({"last_id": changes[-1]['id'] if changes else since, "events": changes})
+
+# 回應快取的命中率統計
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+def warm_cache():
+    """Builds the cached response of every endpoint once, so the first requests after startup are served from the cache.
+
+    Called by `wsgi.py` before the server forks its workers, which then all start with the warmed cache.
+    """
+    with app.test_client() as client:
+        dates = client.get('/api/dates').get_json()
+        paths = ['/api/trading-performance', '/api/low-risk-stocks', '/api/sharpe-ratios', '/api/quarterly-predictions', '/api/snapshot']
+        for path in paths + [f'/api/{date}' for date in dates]:
+            client.get(path)
+    return response_cache.stats()
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=True)
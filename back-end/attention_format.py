@@ -0,0 +1,72 @@
+import struct
+
+import numpy as np
+import pandas as pd
+
+# Compact binary form of a GAT attention matrix (`GAT_main/output/tensor_epoch_<date>.csv`), all integers little-endian:
+#
+#   b'GATM' | uint32 n_rows | uint32 n_cols | uint32 codes_len | stock codes, comma separated UTF-8 (codes_len bytes)
+#   | zero padding to a multiple of 4 bytes | n_rows * n_cols float32, row-major
+#
+# so a client can view the values directly, e.g. `new Float32Array(buffer, offset, n_rows * n_cols)` in JavaScript.
+# A multi-date stream is a sequence of frames: uint32 date_len | date (UTF-8) | zero padding to a multiple of 4 bytes
+# | uint32 body_len | body as above | zero padding to a multiple of 4 bytes. Every frame is a multiple of 4 bytes long
+# and every body starts at a multiple of 4 bytes from the start of the stream, so its float32 values can be viewed
+# in place as well.
+
+MAGIC = b'GATM'
+MIMETYPE = 'application/octet-stream'
+_HEADER = struct.Struct('<4sIII')
+_LENGTH = struct.Struct('<I')
+
+
+def read_attention(csv_file_path, dtype=np.float32):
+    """The attention matrix and the stock codes of its columns (an index column written by pandas is dropped)."""
+    df = pd.read_csv(csv_file_path)
+    df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed: ')])
+    return df.to_numpy(dtype=dtype), [str(c) for c in df.columns]
+
+
+def encode_matrix(matrix, stock_codes):
+    matrix = np.ascontiguousarray(matrix, dtype='<f4')
+    n_rows, n_cols = matrix.shape
+    codes = ','.join(stock_codes).encode('utf-8')
+    padding = -(_HEADER.size + len(codes)) % 4
+    return b''.join([_HEADER.pack(MAGIC, n_rows, n_cols, len(codes)), codes, b'\0' * padding, matrix.tobytes()])
+
+
+def decode_matrix(body):
+    """Inverse of `encode_matrix`, returns the (n_rows, n_cols) float32 matrix and the stock codes."""
+    magic, n_rows, n_cols, codes_len = _HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError('not a GAT attention matrix')
+    offset = _HEADER.size + codes_len
+    codes = bytes(body[_HEADER.size:offset]).decode('utf-8')
+    offset += -offset % 4
+    matrix = np.frombuffer(body, dtype='<f4', count=n_rows * n_cols, offset=offset).reshape(n_rows, n_cols)
+    return matrix, codes.split(',') if codes else []
+
+
+def encode_frame(date, body):
+    """One frame of a multi-date stream."""
+    date = date.encode('utf-8')
+    return b''.join([_LENGTH.pack(len(date)), date, b'\0' * _padding(len(date)),
+                     _LENGTH.pack(len(body)), body, b'\0' * _padding(len(body))])
+
+
+def decode_frames(stream):
+    """Splits a multi-date stream into (date, body) pairs."""
+    stream = memoryview(stream)
+    offset = 0
+    while offset < len(stream):
+        (date_len,) = _LENGTH.unpack_from(stream, offset)
+        date = bytes(stream[offset + 4:offset + 4 + date_len]).decode('utf-8')
+        offset += 4 + date_len + _padding(date_len)
+        (body_len,) = _LENGTH.unpack_from(stream, offset)
+        yield date, stream[offset + 4:offset + 4 + body_len]
+        offset += 4 + body_len + _padding(body_len)
+
+
+def _padding(length):
+    # zero bytes that round `length` up to a multiple of 4
+    return -length % 4
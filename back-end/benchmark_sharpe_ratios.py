@@ -0,0 +1,70 @@
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from app import build_sharpe_ratios
+
+#################################
+### /api/sharpe-ratios BUILD  ###
+#################################
+
+def legacy_sharpe_ratios(file_path):
+    # the previous handler filtered the whole frame once per stock
+    df = pd.read_csv(file_path)
+    sharpe_data = {}
+    for stock_id in df['stock_id'].unique():
+        stock_data = df[df['stock_id'] == stock_id]
+        sharpe_data[stock_id] = {
+            'dates': stock_data['date'].tolist(),
+            'values': stock_data['sharpe_ratio'].tolist()
+        }
+    return sharpe_data
+
+def write_synthetic(file_path, n_stocks, n_quarters, seed):
+    """Writes a SharpeRatio.csv with the layout of `Stock-Picked Agent/SharpeRatio.csv`: one block of quarters per stock."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2013-05-16', periods=n_quarters, freq='QS-FEB').strftime('%m/%d/%Y')
+    stock_ids = [f'{1000 + i}.TW' for i in range(n_stocks)]
+    pd.DataFrame({
+        'date': np.tile(dates, n_stocks),
+        'stock_id': np.repeat(stock_ids, n_quarters),
+        'sharpe_ratio': rng.normal(0, 0.1, n_stocks * n_quarters),
+    }).to_csv(file_path, index=False)
+
+def best_time(build, file_path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start_t = time.perf_counter()
+        result = build(file_path)
+        timings.append(time.perf_counter() - start_t)
+    return min(timings), result
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark building the /api/sharpe-ratios response')
+    parser.add_argument('--stocks', type=int, default=2000,
+                        help='number of synthetic stocks (default: 2000)')
+    parser.add_argument('--quarters', type=int, default=40,
+                        help='number of quarters per stock (default: 40)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per variant, the best one is reported (default: 3)')
+    parser.add_argument('--seed', type=int, default=13, metavar='S',
+                        help='random seed (default: 13)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'SharpeRatio.csv')
+        write_synthetic(file_path, args.stocks, args.quarters, args.seed)
+
+        legacy_t, legacy = best_time(legacy_sharpe_ratios, file_path, args.repeat)
+        current_t, current = best_time(build_sharpe_ratios, file_path, args.repeat)
+
+    # both builds return the same data, see tests/test_sharpe_ratios.py
+
+    print(f'{args.stocks} stocks x {args.quarters} quarters')
+    print(f'{"legacy (s)":>12} {"current (s)":>12} {"speedup":>8}')
+    print(f'{legacy_t:>12.3f} {current_t:>12.3f} {legacy_t / current_t:>7.1f}x')
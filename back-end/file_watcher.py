@@ -0,0 +1,121 @@
+import os
+import glob
+import time
+import threading
+from collections import deque
+
+
+def event_id(time_ns):
+    return time_ns // 1000
+
+
+class ChangeFeed:
+    """
+    Watches the output files the API serves and publishes a change event whenever one is created, modified or deleted.
+
+    The files are found by polling: every `interval` seconds the glob patterns are expanded and the (mtime, size) of
+    every match is compared with the previous scan, which costs a few dozen `stat` calls and works the same on Linux,
+    Windows and bind-mounted docker volumes (where inotify events are often not delivered).
+
+    The id of an event is the modification time of the file it reports in microseconds (the time of the scan that
+    noticed it for a deleted file; microseconds keep the ids exact as JavaScript numbers), so every server worker, which watches the same files on its own, gives a change the same id. A client that
+    reconnects to any worker with the id of the last event it saw (SSE `Last-Event-ID` or long-poll `since`) receives the
+    events it missed: the last `history` events the worker published, and every file modified after that id that the
+    worker saw before it started watching. Deletions are the only events two workers number differently, a client
+    switching workers may receive one of them twice.
+    """
+
+    def __init__(self, watched, interval=2.0, history=256, describe=None):
+        """
+        Args:
+            watched (list): (resource, glob pattern) pairs, the resource name is sent with every event of its files.
+            describe (callable, optional): describe(resource, path) -> dict of extra fields of an event.
+        """
+        self.watched = watched
+        self.interval = interval
+        self.describe = describe
+        self._events = deque(maxlen=history) # (id, path, event)
+        self._last_id = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._files = {}
+
+    @property
+    def last_id(self):
+        with self._condition:
+            return self._last_id
+
+    def start(self):
+        """Starts the watcher thread once per process (threads do not survive the fork of the server workers)."""
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._files = self._scan()
+                self._last_id = max([event_id(mtime_ns) for _, mtime_ns, _ in self._files.values()], default=self._last_id)
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+        return self
+
+    def _scan(self):
+        files = {}
+        for resource, pattern in self.watched:
+            for path in glob.glob(pattern):
+                try:
+                    st = os.stat(path)
+                except OSError: # removed between glob and stat
+                    continue
+                files[path] = (resource, st.st_mtime_ns, st.st_size)
+        return files
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.update(self._scan())
+
+    def update(self, files):
+        """Compares a scan (path -> (resource, mtime_ns, size)) with the previous one and publishes the differences."""
+        changes = []
+        with self._condition:
+            for path, (resource, mtime_ns, size) in files.items():
+                old = self._files.get(path)
+                if old is None:
+                    changes.append((event_id(mtime_ns), resource, path, 'created'))
+                elif old[1:] != (mtime_ns, size):
+                    changes.append((event_id(mtime_ns), resource, path, 'modified'))
+            deleted_id = max(event_id(time.time_ns()), self._last_id + 1)
+            for path, (resource, _, _) in self._files.items():
+                if path not in files:
+                    changes.append((deleted_id, resource, path, 'deleted'))
+            self._files = files
+            if changes:
+                self.publish(changes)
+
+    def _event(self, event_id, resource, path, change):
+        event = {'id': event_id, 'resource': resource, 'file': os.path.basename(path), 'change': change}
+        if self.describe is not None:
+            event.update(self.describe(resource, path))
+        return event
+
+    def publish(self, changes):
+        """Appends one event per (id, resource, path, change) and wakes up every waiting client."""
+        with self._condition:
+            for event_id, resource, path, change in sorted(changes):
+                self._events.append((event_id, path, self._event(event_id, resource, path, change)))
+                self._last_id = max(self._last_id, event_id)
+            self._condition.notify_all()
+
+    def wait(self, since, timeout):
+        """
+        Events with an id greater than `since`, waiting up to `timeout` seconds for the next one if there are none yet.
+
+        Returns:
+            list: the events in id order, empty if the timeout expired.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id > since, timeout=timeout)
+            events = [(event_id, path, event) for event_id, path, event in self._events if event_id > since]
+            # 舊於歷史紀錄的 id（例如來自另一個 worker 或較早的連線）：以目前檔案的 mtime 補上期間修改過的檔案
+            published = {(event_id, path) for event_id, path, _ in events}
+            for path, (resource, mtime_ns, _) in self._files.items():
+                if event_id(mtime_ns) > since and (event_id(mtime_ns), path) not in published:
+                    events.append((event_id(mtime_ns), path, self._event(event_id(mtime_ns), resource, path, 'modified')))
+            return [event for _, _, event in sorted(events, key=lambda e: e[:2])]
@@ -0,0 +1,21 @@
+import os
+import multiprocessing
+
+# gunicorn 設定檔，啟動方式: gunicorn -c gunicorn.conf.py
+# 工作進程與執行緒數可用環境變數 GUNICORN_WORKERS / GUNICORN_THREADS 調整
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# 每個 worker 有自己的回應快取，請求多為 pandas / 檔案 I/O，執行緒可以重疊等待
+workers = int(os.environ.get('GUNICORN_WORKERS', min(2 * multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# 在 master 中載入 app 並預熱快取，fork 出的 worker 直接使用
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', None) # '-' 輸出到 stdout
+errorlog = '-'
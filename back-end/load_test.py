@@ -0,0 +1,74 @@
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import aiohttp
+
+#################################
+###  API LOAD TEST (p50/p99)  ###
+#################################
+
+DEFAULT_ENDPOINTS = ['/api/dates', '/api/{date}', '/api/trading-performance', '/api/low-risk-stocks',
+                     '/api/sharpe-ratios', '/api/quarterly-predictions']
+
+async def run_endpoint(session, url, n_requests, concurrency):
+    """Sends `n_requests` GETs to `url` from `concurrency` concurrent clients and returns latencies, errors and wall time."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(n_requests))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            start_t = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start_t)
+
+    start_t = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return np.array(latencies), errors, time.perf_counter() - start_t
+
+async def main(args):
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, headers={'Accept-Encoding': args.accept_encoding}) as session:
+        async with session.get(args.base_url + '/api/dates') as response:
+            dates = await response.json()
+        date = args.date or dates[0]
+
+        print(f'{args.requests} requests per endpoint, {args.concurrency} concurrent clients, date {date}')
+        print(f'{"endpoint":<30} {"p50 (ms)":>9} {"p99 (ms)":>9} {"RPS":>8} {"errors":>7}')
+        for endpoint in args.endpoints:
+            path = endpoint.format(date=date)
+            url = args.base_url + path
+            await run_endpoint(session, url, args.warmup, args.concurrency)
+            latencies, errors, wall_t = await run_endpoint(session, url, args.requests, args.concurrency)
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f'{path:<30} {p50:>9.2f} {p99:>9.2f} {len(latencies) / wall_t:>8.1f} {errors:>7}')
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Load test a running back-end API and report p50/p99 latency and RPS per endpoint')
+    parser.add_argument('--base-url', type=str, default='http://localhost:5000',
+                        help='address of the running API (default: http://localhost:5000)')
+    parser.add_argument('--endpoints', type=str, nargs='+', default=DEFAULT_ENDPOINTS,
+                        help='endpoints to test, {date} is replaced by --date (default: every GET endpoint)')
+    parser.add_argument('--date', type=str, default=None,
+                        help='date of the attention matrix endpoint (default: latest date of /api/dates)')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='timed requests per endpoint (default: 500)')
+    parser.add_argument('--warmup', type=int, default=20,
+                        help='untimed requests per endpoint (default: 20)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='concurrent clients (default: 16)')
+    parser.add_argument('--accept-encoding', type=str, default='gzip, deflate, br',
+                        help='Accept-Encoding header of the requests (default: gzip, deflate, br, as a browser)')
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
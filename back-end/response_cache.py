@@ -0,0 +1,113 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError: # brotli is optional, responses are then only gzip-compressed
+    brotli = None
+
+# bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+
+class CachedBody:
+    """
+    A serialized response body together with its validators and its compressed variants.
+
+    The ETag is the SHA-1 of the body, so it only changes when the content does (an output file that is
+    rewritten with the same values keeps its ETag). `last_modified` is the newest mtime of the source files.
+    """
+
+    def __init__(self, body, signature):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = max((mtime_ns for _, mtime_ns, _ in signature), default=0) / 1e9
+        self.encodings = {}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=5)
+
+    @property
+    def nbytes(self):
+        return len(self.body) + sum(len(b) for b in self.encodings.values())
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of already-serialized response bodies.
+
+    Every entry is keyed by a name (usually the endpoint and its arguments) and validated against the
+    (path, mtime, size) signature of the source files it was built from, so a body is rebuilt as soon as
+    one of its files changes. The total size (including the compressed variants) of the cached bodies is bounded by `max_bytes`; the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (signature, CachedBody)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def signature(paths):
+        """(path, mtime, size) of every source file, raises FileNotFoundError if one is missing."""
+        signature = []
+        for path in paths:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def get_or_build(self, key, paths, build):
+        """
+        Returns the cached `CachedBody` for `key` if its source files are unchanged, otherwise calls
+        `build()` (which must return bytes), caches the result and returns it.
+        """
+        signature = self.signature(paths)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # build outside the lock, concurrent misses on the same key simply build twice
+        body = CachedBody(build(), signature)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1].nbytes
+            if body.nbytes <= self.max_bytes:
+                self._entries[key] = (signature, body)
+                self._size += body.nbytes
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+                self.evictions += 1
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
@@ -0,0 +1,139 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import app
+import trading_store
+
+
+# the handlers before the response cache, as they serialized the repository's data files
+
+def legacy_dates():
+    files = glob.glob(os.path.join(app.GAT_OUTPUT_DIR, '*.csv'))
+    dates = [os.path.basename(f).replace('tensor_epoch_', '').replace('.csv', '') for f in files]
+    dates.sort(reverse=True)
+    return app.jsonify(dates)
+
+def legacy_gat(date):
+    df = pd.read_csv(app.gat_output_path(date))
+    return app.jsonify(df.to_dict(orient='records'))
+
+def legacy_text(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return app.app.make_response(file.read())
+
+def legacy_sharpe_ratios():
+    df = pd.read_csv(app.SHARPE_RATIOS)
+    sharpe_data = {}
+    for stock_id in df['stock_id'].unique():
+        stock_data = df[df['stock_id'] == stock_id]
+        sharpe_data[stock_id] = {
+            'dates': stock_data['date'].tolist(),
+            'values': stock_data['sharpe_ratio'].tolist()
+        }
+    return app.jsonify(sharpe_data)
+
+def legacy_trading_performance():
+    actions_df = pd.read_csv(app.TRADING_ACTIONS)
+    account_value_df = pd.read_csv(app.TRADING_ACCOUNT_VALUE)
+    account_value_df['daily_return'] = account_value_df['account_value'].pct_change()
+    # the old handler set this through chained indexing, which still wrote to the frame before pandas 3
+    account_value_df.loc[0, 'daily_return'] = 0
+    account_value_df['cumulative_return'] = (account_value_df['account_value'] / account_value_df['account_value'].iloc[0]) - 1
+    return app.jsonify({
+        "actions": actions_df.to_dict(orient='records'),
+        "account_value": account_value_df[['date', 'account_value', 'daily_return', 'cumulative_return']].to_dict(orient='records'),
+        "stocks": actions_df.columns[1:].tolist()
+    })
+
+@pytest.fixture
+def client():
+    app.response_cache.clear()
+    return app.app.test_client()
+
+def legacy_body(build, *args):
+    with app.app.test_request_context():
+        return build(*args).get_data()
+
+@pytest.mark.parametrize('url, build, args', [
+    ('/api/dates', legacy_dates, ()),
+    ('/api/2024-05-16', legacy_gat, ('2024-05-16',)),
+    ('/api/2015-05-16', legacy_gat, ('2015-05-16',)),
+    ('/api/low-risk-stocks', legacy_text, (app.LOW_RISK_STOCKS,)),
+    ('/api/sharpe-ratios', legacy_sharpe_ratios, ()),
+    ('/api/quarterly-predictions', legacy_text, (app.QUARTERLY_PREDICTIONS,)),
+])
+def test_single_endpoints_are_byte_identical(client, url, build, args):
+    expected = legacy_body(build, *args)
+    # built on the first request, served from the response cache on the second
+    for _ in range(2):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.data == expected
+
+
+def test_trading_performance_keeps_the_old_payload(client):
+    expected = legacy_body(legacy_trading_performance)
+    added = set(trading_store.SERIES) - {'account_value', 'daily_return', 'cumulative_return'}
+    for _ in range(2):
+        response = client.get('/api/trading-performance')
+        assert response.status_code == 200
+        data = response.get_json()
+        # the full payload is the old one plus the precomputed drawdown and rolling series of every day
+        assert all(added <= set(row) for row in data['account_value'])
+        data['account_value'] = [{k: v for k, v in row.items() if k not in added} for row in data['account_value']]
+        with app.app.test_request_context():
+            assert app.jsonify(data).get_data() == expected
+
+@pytest.mark.parametrize('query', [
+    'foo=1',
+    'every=abc',
+    'every=',
+    'points=1.5',
+    'limit=-3',
+    'every=0',
+    'start=May',
+    'cursor=2024-5-1',
+    'every=2&every=3',
+    'tickers=0000',
+])
+def test_trading_performance_rejects_bad_parameters(client, query):
+    response = client.get(f'/api/trading-performance?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert app.response_cache.stats()['entries'] == 0
+
+def test_equivalent_trading_queries_share_a_cache_entry(client):
+    misses = app.response_cache.stats()['misses']
+    bodies = [client.get(f'/api/trading-performance?{query}').data
+              for query in ['start=2024-06-01', 'start=2024-06-01&every=1', 'every=01&start=2024-06-01', 'tickers=&start=2024-06-01']]
+    assert all(body == bodies[0] for body in bodies)
+    stats = app.response_cache.stats()
+    assert (stats['entries'], stats['misses'] - misses) == (1, 1)
+
+@pytest.mark.parametrize('warm', [False, True])
+def test_snapshot_splices_the_single_endpoint_bodies(client, warm):
+    if warm:
+        for url in ['/api/dates', '/api/trading-performance', '/api/low-risk-stocks', '/api/sharpe-ratios']:
+            client.get(url)
+    latest = client.get('/api/dates').get_json()[0]
+    parts = [
+        ('dates', legacy_body(legacy_dates)),
+        ('attention', legacy_body(legacy_gat, latest)),
+        ('trading_performance', client.get('/api/trading-performance').data),
+        ('low_risk_stocks', json.dumps(legacy_body(legacy_text, app.LOW_RISK_STOCKS).decode('utf-8')).encode('utf-8')),
+        ('sharpe_ratios', legacy_body(legacy_sharpe_ratios)),
+        ('quarterly_predictions', json.dumps(legacy_body(legacy_text, app.QUARTERLY_PREDICTIONS).decode('utf-8')).encode('utf-8')),
+    ]
+    expected = b'{"latest_date":' + json.dumps(latest).encode('utf-8')
+    expected += b''.join(b',"' + name.encode('utf-8') + b'":' + body.rstrip() for name, body in parts) + b'}\n'
+
+    response = client.get('/api/snapshot')
+    assert response.status_code == 200
+    assert response.data == expected
+    data = response.get_json()
+    assert data['latest_date'] == latest
+    assert data['trading_performance'] == client.get('/api/trading-performance').get_json()
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+import attention_format
+
+
+@pytest.mark.parametrize('dates', [['2024-05-16', '2024-02-15'], ['2024-5-16', '2024-02-15', 'x', 'ab']])
+def test_frame_bodies_are_4_byte_aligned(dates):
+    rng = np.random.default_rng(0)
+    matrices = {date: rng.random((3, 3), dtype=np.float32) for date in dates}
+    codes = ['2330', '2317', '1101']
+    stream = b''.join(attention_format.encode_frame(date, attention_format.encode_matrix(m, codes))
+                      for date, m in matrices.items())
+    assert len(stream) % 4 == 0
+
+    decoded = list(attention_format.decode_frames(stream))
+    assert [date for date, _ in decoded] == dates
+    for date, body in decoded:
+        matrix, stock_codes = attention_format.decode_matrix(body)
+        np.testing.assert_array_equal(matrix, matrices[date])
+        assert stock_codes == codes
+    # the offset of every body in the stream, as a client viewing the whole response buffer sees it
+    offset = 0
+    for _, body in decoded:
+        offset = stream.index(bytes(body), offset)
+        assert offset % 4 == 0
+        offset += len(body)
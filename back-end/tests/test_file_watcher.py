@@ -0,0 +1,45 @@
+import os
+
+from file_watcher import ChangeFeed
+
+
+def touch(path, mtime_ns, text='x'):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_workers_give_a_change_the_same_id(tmp_path):
+    touch(tmp_path / 'a.csv', 1_000_000_000)
+    # two server workers watching the same files, each with its own feed
+    feeds = [ChangeFeed([('gat', str(tmp_path / '*.csv'))]) for _ in range(2)]
+    for feed in feeds:
+        feed._files = feed._scan()
+    touch(tmp_path / 'b.csv', 2_000_000_000)
+    for feed in feeds:
+        feed.update(feed._scan())
+    first, second = [feed.wait(1_000_000, timeout=0) for feed in feeds]
+    assert first == second == [{'id': 2_000_000, 'resource': 'gat', 'file': 'b.csv', 'change': 'created'}]
+    # the id of the last event seen on one worker resumes the stream on the other
+    assert feeds[1].wait(first[-1]['id'], timeout=0) == []
+
+
+def test_id_older_than_the_worker_replays_modified_files(tmp_path):
+    touch(tmp_path / 'a.csv', 1_000_000_000)
+    touch(tmp_path / 'b.csv', 3_000_000_000)
+    feed = ChangeFeed([('gat', str(tmp_path / '*.csv'))], interval=3600).start()
+    assert feed.last_id == 3_000_000
+    # a client of another worker saw the change of a.csv, b.csv changed before this worker started
+    events = feed.wait(1_000_000, timeout=0)
+    assert [(event['file'], event['id'], event['change']) for event in events] == [('b.csv', 3_000_000, 'modified')]
+
+
+def test_deleted_file(tmp_path):
+    touch(tmp_path / 'a.csv', 1_000_000_000)
+    feed = ChangeFeed([('gat', str(tmp_path / '*.csv'))])
+    feed._files = feed._scan()
+    os.remove(tmp_path / 'a.csv')
+    feed.update(feed._scan())
+    events = feed.wait(1_000_000, timeout=0)
+    assert [(event['file'], event['change']) for event in events] == [('a.csv', 'deleted')]
+    assert events[0]['id'] > 1_000_000
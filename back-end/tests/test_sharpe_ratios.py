@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import build_sharpe_ratios
+from benchmark_sharpe_ratios import legacy_sharpe_ratios, write_synthetic
+
+
+@pytest.mark.parametrize('n_stocks, n_quarters', [(1, 1), (3, 5), (50, 12)])
+def test_matches_legacy_build(tmp_path, n_stocks, n_quarters):
+    file_path = tmp_path / 'SharpeRatio.csv'
+    write_synthetic(file_path, n_stocks, n_quarters, seed=0)
+    expected = legacy_sharpe_ratios(file_path)
+    result = build_sharpe_ratios(file_path)
+    assert result == expected
+    assert list(result) == list(expected) # stocks in order of first appearance
+
+def test_interleaved_rows_keep_their_order(tmp_path):
+    # rows of a stock are not contiguous and not sorted by date
+    file_path = tmp_path / 'SharpeRatio.csv'
+    rng = np.random.default_rng(1)
+    pd.DataFrame({
+        'date': rng.choice(['05/16/2013', '08/15/2013', '11/15/2013', '04/01/2014'], 40),
+        'stock_id': rng.choice(['2330.TW', '1101.TW', '2317.TW', '1229.TW'], 40),
+        'sharpe_ratio': rng.normal(0, 0.1, 40),
+    }).to_csv(file_path, index=False)
+    expected = legacy_sharpe_ratios(file_path)
+    result = build_sharpe_ratios(file_path)
+    assert result == expected
+    assert list(result) == list(expected)
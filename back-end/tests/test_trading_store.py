@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import trading_store
+
+
+def write_account_value(path, n_days=60, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'date': pd.bdate_range('2024-01-01', periods=n_days).strftime('%Y-%m-%d'),
+        'account_value': 1e6 * np.exp(np.cumsum(rng.normal(0, 0.01, n_days))),
+    }).to_csv(path)
+
+
+def test_cache_is_reused(tmp_path, monkeypatch):
+    source = tmp_path / 'account_value.csv'
+    write_account_value(source)
+    first = trading_store.load_return_series(str(source))
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the series were recomputed instead of loading the cache')
+
+    monkeypatch.setattr(trading_store.pd, 'read_csv', fail)
+    second = trading_store.load_return_series(str(source))
+    for key in ['dates'] + trading_store.SERIES:
+        np.testing.assert_array_equal(first[key], second[key])
+
+
+def test_truncated_cache_is_a_cache_miss(tmp_path):
+    source = tmp_path / 'account_value.csv'
+    write_account_value(source)
+    expected = trading_store.load_return_series(str(source))
+    cache = tmp_path / trading_store.RETURN_SERIES_CACHE
+    cache.write_bytes(cache.read_bytes()[:100]) # a zip file cut off while it was written
+
+    rebuilt = trading_store.load_return_series(str(source))
+    np.testing.assert_array_equal(rebuilt['account_value'], expected['account_value'])
+    # the rebuilt cache replaced the truncated one, without leaving temporary files behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['account_value.csv', trading_store.RETURN_SERIES_CACHE]
+    assert np.load(cache)['source'].shape == (3,)
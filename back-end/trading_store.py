@@ -0,0 +1,211 @@
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from response_cache import ResponseCache
+
+RETURN_SERIES_CACHE = 'return_series.npz'
+ROLLING_WINDOW = 20 # trading days of the rolling volatility / Sharpe ratio
+SERIES = ['account_value', 'daily_return', 'cumulative_return', 'drawdown', 'rolling_volatility', 'rolling_sharpe']
+
+
+def load_return_series(account_value_path, window=ROLLING_WINDOW, cache_path=None):
+    """
+    Loads `account_value.csv` together with its derived return series, computed once per version of the file.
+
+    The series are persisted next to the source as a columnar `.npz` file (one array per series), which is reused
+    as long as the modification time and size of the source and the rolling window are unchanged.
+
+    Returns:
+        dict: `dates` and the float64 arrays of `SERIES`, sorted by date. `daily_return` is 0 on the first day,
+            the rolling series are annualized (252 trading days) and NaN until `window` returns are available.
+    """
+    if cache_path is None:
+        cache_path = os.path.join(os.path.dirname(account_value_path), RETURN_SERIES_CACHE)
+    (_, mtime_ns, size), = ResponseCache.signature([account_value_path])
+    source = np.array([mtime_ns, size, window], dtype=np.int64)
+
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache:
+                if np.array_equal(cache['source'], source):
+                    return {key: cache[key] for key in ['dates'] + SERIES}
+        except Exception:
+            pass # unreadable (e.g. truncated) or stale cache layout, rebuild it below
+
+    df = pd.read_csv(account_value_path).sort_values('date', kind='stable')
+    account_value = df['account_value'].to_numpy(dtype=np.float64)
+    daily_return = np.zeros_like(account_value)
+    daily_return[1:] = account_value[1:] / account_value[:-1] - 1
+    returns = pd.Series(daily_return).rolling(window, min_periods=window)
+    rolling_std = returns.std().to_numpy()
+    data = {
+        'dates': df['date'].to_numpy().astype(str),
+        'account_value': account_value,
+        'daily_return': daily_return,
+        'cumulative_return': account_value / account_value[0] - 1 if len(account_value) else account_value,
+        'drawdown': account_value / np.maximum.accumulate(account_value) - 1 if len(account_value) else account_value,
+        'rolling_volatility': rolling_std * 252**0.5,
+        'rolling_sharpe': (252**0.5) * returns.mean().to_numpy() / rolling_std,
+    }
+
+    # every server worker rebuilds the cache on its own: each writes a temporary file of its own and
+    # publishes it with an atomic rename, so the cache file is always one complete write
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(cache_path) + '.', suffix='.tmp',
+                                        dir=os.path.dirname(cache_path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, source=source, **data)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass # the cache is optional, e.g. on a read-only volume the series are recomputed
+    return data
+
+
+def _json_floats(values):
+    # NaN is not valid JSON, missing values are sent as null
+    values = values.astype(object)
+    values[pd.isna(values)] = None
+    return values.tolist()
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of the series (x, y) to `n_out` points.
+
+    Keeps the first and the last point and, in every bucket in between, the point that forms the largest
+    triangle with the previously kept point and the mean of the next bucket, so peaks and drawdowns survive.
+
+    Returns:
+        np.ndarray: sorted indices of the kept points.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:n_out]
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64) # n_out - 2 buckets between the first and last point
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        mean_x, mean_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+class TradingStore:
+    """
+    Indexed in-memory copy of `actions.csv` and `account_value.csv`.
+
+    Both tables are sorted by date once when loaded, the return series come precomputed from `load_return_series`,
+    and queries slice them by binary search on the dates, so the work per request scales with the requested window
+    rather than with the whole history.
+    """
+
+    def __init__(self, actions_path, account_value_path):
+        actions_df = pd.read_csv(actions_path).sort_values('date', kind='stable')
+        self.stocks = actions_df.columns[1:].tolist()
+        self._stock_index = {stock: i for i, stock in enumerate(self.stocks)}
+        self.action_dates = actions_df['date'].to_numpy().astype(str)
+        self.actions = actions_df[self.stocks].to_numpy()
+
+        self.series = load_return_series(account_value_path)
+        self.dates = self.series['dates']
+        self.account_value = self.series['account_value']
+
+        # pagination runs over the union of the dates of both tables
+        self.all_dates = np.union1d(self.action_dates, self.dates)
+
+    def query(self, start=None, end=None, tickers=None, every=1, points=None, limit=None, cursor=None):
+        """
+        Actions and account values in the date range [start, end] (ISO dates, both inclusive).
+
+        Args:
+            tickers (list, optional): stocks whose actions are returned (default: all stocks).
+            every (int): keep every Nth row of the window.
+            points (int, optional): downsample the account values to this many points with LTTB (for charts),
+                the actions are thinned to about as many rows.
+            limit (int, optional): number of dates per page.
+            cursor (str, optional): `next_cursor` of the previous page.
+
+        Returns:
+            dict: `actions`, `account_value` (date and `SERIES` per day) and `stocks` as in the full
+            `/api/trading-performance` response, plus `next_cursor` (None on the last page). Returns and drawdowns
+            are relative to the whole history, not to the window.
+
+        Raises:
+            ValueError: unknown ticker or invalid argument.
+        """
+        if tickers is None:
+            columns = np.arange(len(self.stocks))
+        else:
+            unknown = [t for t in tickers if t not in self._stock_index]
+            if unknown:
+                raise ValueError(f'unknown tickers: {", ".join(unknown)}')
+            columns = np.array([self._stock_index[t] for t in tickers], dtype=np.int64)
+        if every < 1 or (points is not None and points < 1) or (limit is not None and limit < 1):
+            raise ValueError('every, points and limit must be positive')
+
+        # 日期範圍與分頁：在排序後的日期上二分搜尋
+        lo = 0 if start is None else np.searchsorted(self.all_dates, start, side='left')
+        hi = len(self.all_dates) if end is None else np.searchsorted(self.all_dates, end, side='right')
+        if cursor is not None:
+            lo = max(lo, np.searchsorted(self.all_dates, cursor, side='left'))
+        next_cursor = None
+        if limit is not None and hi - lo > limit:
+            next_cursor = str(self.all_dates[lo + limit])
+            hi = lo + limit
+        if lo >= hi:
+            return {"actions": [], "account_value": [], "stocks": [self.stocks[c] for c in columns], "next_cursor": None}
+        first, last = self.all_dates[lo], self.all_dates[hi - 1]
+
+        a_lo, a_hi = np.searchsorted(self.action_dates, first, 'left'), np.searchsorted(self.action_dates, last, 'right')
+        v_lo, v_hi = np.searchsorted(self.dates, first, 'left'), np.searchsorted(self.dates, last, 'right')
+        action_rows = np.arange(a_lo, a_hi)[::every]
+        value_rows = np.arange(v_lo, v_hi)[::every]
+
+        if points is not None:
+            y = self.account_value[value_rows]
+            value_rows = value_rows[lttb(np.arange(len(y), dtype=np.float64), y, points)]
+            if len(action_rows) > points:
+                action_rows = action_rows[np.linspace(0, len(action_rows) - 1, points).round().astype(np.int64)]
+
+        stocks = [self.stocks[c] for c in columns]
+        actions = self.actions[np.ix_(action_rows, columns)].tolist()
+        return {
+            "actions": [dict(zip(['date'] + stocks, [date] + row)) for date, row in zip(self.action_dates[action_rows].tolist(), actions)],
+            "account_value": [
+                dict(zip(['date'] + SERIES, row))
+                for row in zip(self.dates[value_rows].tolist(), *(_json_floats(self.series[name][value_rows]) for name in SERIES))
+            ],
+            "stocks": stocks,
+            "next_cursor": next_cursor,
+        }
+
+
+_store = None
+_store_signature = None
+_store_lock = threading.Lock()
+
+def get_store(actions_path, account_value_path):
+    """The `TradingStore` of the two files, reloaded when one of them changes (same mtime check as the response cache)."""
+    global _store, _store_signature
+    signature = ResponseCache.signature([actions_path, account_value_path])
+    with _store_lock:
+        if _store is None or _store_signature != signature:
+            _store = TradingStore(actions_path, account_value_path)
+            _store_signature = signature
+        return _store
@@ -0,0 +1,12 @@
+"""
+Production entry point of the back-end API.
+
+    gunicorn -c gunicorn.conf.py
+
+`app.py` is imported and its response cache warmed once in the gunicorn master (`preload_app`),
+the forked workers share the warmed cache pages copy-on-write.
+"""
+from app import app, warm_cache
+
+stats = warm_cache()
+print(f"response cache warmed: {stats['entries']} entries, {stats['size_bytes'] / 2**20:.1f} MiB")